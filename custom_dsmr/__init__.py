@@ -4,22 +4,154 @@ import asyncio
 import voluptuous as vol
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE
+from homeassistant.core import HomeAssistant, ServiceCall, callback
+import homeassistant.helpers.config_validation as cv
 
-from .const import DOMAIN, PLATFORMS
+from .api import create_session
+from .const import (
+    ATTR_END,
+    ATTR_PERIOD,
+    ATTR_START,
+    DOMAIN,
+    EVENT_DIAGNOSTICS,
+    EVENT_USAGE,
+    MAX_PARALLEL_REQUESTS,
+    PLATFORMS,
+    SERVICE_DIAGNOSTICS,
+    SERVICE_QUERY_USAGE,
+    SERVICE_REFRESH_HISTORY,
+)
+from .coordinator import (
+    DSMRCoordinator,
+    config_hosts,
+    config_p1_sources,
+    config_topics,
+)
+from .diagnostics import async_get_diagnostics
+from .registry import HISTORY_PERIODS
+from .store import HistoryStore, as_local, recid_range, store_path
 
 CONFIG_SCHEMA = vol.Schema({DOMAIN: vol.Schema({})}, extra=vol.ALLOW_EXTRA)
 
+QUERY_USAGE_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_PERIOD): vol.In(["hours", "days", "months"]),
+        vol.Required(ATTR_START): cv.datetime,
+        vol.Required(ATTR_END): cv.datetime,
+    }
+)
+
+REFRESH_HISTORY_SCHEMA = vol.Schema(
+    {vol.Optional(ATTR_PERIOD): vol.In(["hours", "days", "months"])}
+)
+
 
 async def async_setup(hass: HomeAssistant, config: dict):
     """Set up the custom dsmr component from a yaml file."""
+
+    async def async_query_usage(call: ServiceCall):
+        """Fire an event with the usage of every DSMR logger from the local store."""
+        # The recids of the DSMR logger are in local time.
+        period = call.data[ATTR_PERIOD]
+        start, end = recid_range(
+            as_local(call.data[ATTR_START]), as_local(call.data[ATTR_END]), period
+        )
+        usage = {}
+        for coordinators in hass.data.get(DOMAIN, {}).values():
+            for host, coordinator in coordinators.items():
+                store = coordinator.stores.get(period)
+                if store is not None:
+                    usage[host] = await hass.async_add_executor_job(
+                        store.usage, start, end
+                    )
+        hass.bus.async_fire(
+            EVENT_USAGE,
+            {
+                ATTR_PERIOD: period,
+                ATTR_START: call.data[ATTR_START].isoformat(),
+                ATTR_END: call.data[ATTR_END].isoformat(),
+                "usage": usage,
+            },
+        )
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_QUERY_USAGE, async_query_usage, schema=QUERY_USAGE_SCHEMA
+    )
+
+    @callback
+    def async_diagnostics(call: ServiceCall):
+        """Fire an event with the request statistics of every config entry."""
+        for entry in hass.config_entries.async_entries(DOMAIN):
+            if entry.entry_id in hass.data.get(DOMAIN, {}):
+                hass.bus.async_fire(
+                    EVENT_DIAGNOSTICS, async_get_diagnostics(hass, entry)
+                )
+
+    hass.services.async_register(DOMAIN, SERVICE_DIAGNOSTICS, async_diagnostics)
+
+    async def async_refresh_history(call: ServiceCall):
+        """Request the history of every DSMR logger before the next rollover."""
+        periods = [call.data[ATTR_PERIOD]] if ATTR_PERIOD in call.data else None
+        await asyncio.gather(
+            *[
+                coordinator.async_refresh_history(periods)
+                for coordinators in hass.data.get(DOMAIN, {}).values()
+                for coordinator in coordinators.values()
+            ]
+        )
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_REFRESH_HISTORY,
+        async_refresh_history,
+        schema=REFRESH_HISTORY_SCHEMA,
+    )
     return True
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Set up custom dsmr from a config entry."""
     hass.data.setdefault(DOMAIN, {})
-    hass.data[DOMAIN][entry.entry_id] = entry.data
+
+    # One coordinator per DSMR logger polls the logger and fans the result
+    # out to all sensors of that logger. The loggers of an entry are polled
+    # independently, so a slow logger does not delay the others. Every
+    # logger has its own client session, closed when the entry is unloaded.
+    # A logger with an MQTT topic or a P1 port pushes its live readings
+    # instead.
+    semaphore = asyncio.Semaphore(MAX_PARALLEL_REQUESTS)
+    topics = config_topics(entry.data)
+    p1_sources = config_p1_sources(entry.data)
+    coordinators = {
+        host: DSMRCoordinator(
+            hass,
+            create_session(hass),
+            entry.data,
+            host,
+            semaphore,
+            topics[host],
+            p1_sources[host],
+        )
+        for host in config_hosts(entry.data)
+    }
+    hass.data[DOMAIN][entry.entry_id] = coordinators
+
+    # Home Assistant does not unload the config entries when it stops, the
+    # sessions are closed on shutdown like the sessions of the aiohttp helper.
+    for coordinator in coordinators.values():
+        coordinator.unsub_listeners.append(
+            hass.bus.async_listen_once(
+                EVENT_HOMEASSISTANT_CLOSE, coordinator.async_close_session
+            )
+        )
+
+    # The first request runs in the background, so the setup does not wait
+    # for DSMR loggers that are slow or unreachable. The sensors restore
+    # their last state in the meantime.
+    for coordinator in coordinators.values():
+        hass.async_create_task(coordinator.async_refresh())
+        hass.async_create_task(coordinator.async_start_push())
 
     for component in PLATFORMS:
         hass.async_create_task(
@@ -40,6 +172,32 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
         )
     )
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        coordinators = hass.data[DOMAIN].pop(entry.entry_id)
+        for coordinator in coordinators.values():
+            coordinator.async_stop_push()
+            while coordinator.unsub_listeners:
+                coordinator.unsub_listeners.pop()()
+        await asyncio.gather(
+            *[
+                coordinator.async_close_session()
+                for coordinator in coordinators.values()
+            ]
+        )
 
     return unload_ok
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry):
+    """Remove the local history stores of the DSMR loggers of a config entry."""
+    stores = [
+        HistoryStore(store_path(hass, host, period))
+        for host in config_hosts(entry.data)
+        for period in HISTORY_PERIODS
+    ]
+
+    def remove_stores():
+        """Delete the files of the stores."""
+        for store in stores:
+            store.remove()
+
+    await hass.async_add_executor_job(remove_stores)
@@ -0,0 +1,304 @@
+"""Data objects for the DSMR logger restAPI."""
+import asyncio
+import logging
+import time
+
+import async_timeout
+from aiohttp import ClientError, ClientSession, TCPConnector
+
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    DNS_CACHE_TTL,
+    HOST_CONNECTION_LIMIT,
+    KEEPALIVE_TIMEOUT,
+    PROBE_TIMEOUT,
+    REQUEST_TIMEOUT,
+    SENSOR_FORMAT,
+)
+from .history import HISTORY_FIELDS, HistoryColumns
+from .stats import EndpointStats
+from .stream import ReadCounter, async_iter_json_array
+
+_LOGGER = logging.getLogger(__name__)
+
+# Number of usage values exposed as separate sensors, the *_0 and *_1 sensors.
+HISTORY_SENSORS = 2
+# The live readings read from the actual response, all others are skipped.
+LIVE_FIELDS = frozenset(
+    description.key for description in SENSOR_FORMAT.for_period("actual")
+) | {"timestamp"}
+
+
+def create_session(hass):
+    """Create a client session dedicated to a single DSMR logger."""
+    # Every DSMR logger gets its own connection pool. The connections are
+    # reused between polls and the address of the logger is cached, the
+    # number of open connections stays within what the logger can handle.
+    connector = TCPConnector(
+        limit_per_host=HOST_CONNECTION_LIMIT,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        use_dns_cache=True,
+        ttl_dns_cache=DNS_CACHE_TTL,
+    )
+    return ClientSession(connector=connector)
+
+
+async def async_probe(session, url, timeout=PROBE_TIMEOUT):
+    """Return True if the DSMR logger answers a request within the timeout."""
+    try:
+        with async_timeout.timeout(timeout):
+            async with session.get(url) as response:
+                return response.status == 200
+    except (asyncio.TimeoutError, ClientError):
+        return False
+
+
+class DSMRLiveData:
+    """Representation of a DSMR sensor with live usage data."""
+
+    def __init__(self, session, host_api_actual):
+        """Initialize the live data object."""
+        self._data = None
+        self._session = session
+        self._api = host_api_actual
+        self.stats = EndpointStats()
+        self.fetched = None
+
+    @property
+    def data(self):
+        """Return the data."""
+        return self._data
+
+    @property
+    def api(self):
+        """Return the api."""
+        return self._api
+
+    def latest_data(self, sensor):
+        """Return the latest available data."""
+        if self._data is None:
+            return None
+        return self._data.get(sensor)
+
+    def parse_live_data(self, json_data):
+        """Extract the live measurements from the DSMR response."""
+        # The json_data contains all values for the actual power and
+        # energy and gas (running total) meter readings.
+        #
+        # The values we have a sensor for are stored in a flat dictionary
+        # using the meter reading as the key, json_data is left untouched.
+        # E.G.: data["energy_delivered_tariff1"] = 1500
+        if json_data is not None:
+            try:
+                self._data = {
+                    received["name"]: received.get("value", 0)
+                    for received in json_data["actual"]
+                    if received["name"] in LIVE_FIELDS
+                }
+            except KeyError as err:
+                _LOGGER.debug("Failed to read the JSON message using key %s", err)
+
+    def update_pushed(self, readings):
+        """Merge readings pushed by the DSMR logger into the live data."""
+        # A push can hold a part of the telegram, the readings not in it
+        # keep their last value.
+        self._data = {**(self._data or {}), **readings}
+        self.fetched = dt_util.utcnow()
+
+    async def async_update(self):
+        """Request the live measurements from the DSMR logger."""
+        # The polling interval is owned by the update coordinator, every
+        # call results in exactly one request to the DSMR logger. The body is
+        # parsed while it is read, only the readings we have a sensor for
+        # are kept. When the request fails the last received data is kept,
+        # fetched tells how old it is.
+        data = {}
+        counter = ReadCounter()
+        start = time.monotonic()
+        try:
+            with async_timeout.timeout(REQUEST_TIMEOUT):
+                async with self._session.get(self.api) as response:
+                    response.raise_for_status()
+                    async for received in async_iter_json_array(
+                        response.content, "actual", counter=counter
+                    ):
+                        name = received.get("name")
+                        if name in LIVE_FIELDS:
+                            data[name] = received.get("value", 0)
+        except (asyncio.TimeoutError):
+            _LOGGER.error("Timeout connecting to the DSMR meter")
+            self.stats.record_timeout()
+            return False
+        except (ClientError) as err:
+            _LOGGER.error("Error retrieving DSMR data: %s", repr(err))
+            self.stats.record_client_error()
+            return False
+        except ValueError as err:
+            _LOGGER.debug("Failed to read the JSON message: %s", err)
+            self.stats.record_parse_error()
+            return False
+
+        self.stats.record_request(
+            time.monotonic() - start, counter.size, counter.parse_time
+        )
+        self._data = data
+        self.fetched = dt_util.utcnow()
+        return True
+
+
+class DSMRHistData:
+    """Manages the data retreived from the DSMR end device."""
+
+    def __init__(self, session, host_api, period):
+        """Initialize the data object."""
+        self._data = None
+        self._session = session
+        self._api = host_api
+        self._period = period
+        self.stats = EndpointStats()
+        self.fetched = None
+        self._history = HistoryColumns()
+        self._usage = {}
+        self._depth = 0
+
+    @property
+    def data(self):
+        """Return the data."""
+        return self._data
+
+    @property
+    def api(self):
+        """Return the api."""
+        return self._api
+
+    @property
+    def period(self):
+        """Return the history period of this data object."""
+        return self._period
+
+    @property
+    def history(self):
+        """Return the records of the full ring buffer as columns."""
+        return self._history
+
+    @property
+    def usage(self):
+        """Return the usage of every record of the ring buffer per series."""
+        return self._usage
+
+    def latest_data(self, sensor):
+        """Return the latest historical data."""
+        if self._data is None:
+            return None
+        return self._data.get(sensor)
+
+    def update_running(self, readings):
+        """Update the usage of the running period from the live readings."""
+        # The history is only requested after a rollover, in between the
+        # usage of the running period follows the live running totals.
+        if self._data is None or not readings:
+            return
+        usage = self._history.live_deltas(self._period, readings)
+        if usage:
+            self._data = {**self._data, **usage}
+
+    def parse_historical_data(self, json_data):
+        """Extract the historical statistics from the DSMR response."""
+        # The historical data contains the delivered energy, delivered gas and
+        # returned energy values for the requested time period, newest first.
+        # All values are represented by a peak and offpeak value.
+        #
+        # Only the newest record (the running period) still changes, all
+        # older records are final. Parsing stops at the newest record we
+        # already know, the older records are taken from the previous sync.
+        if json_data is not None:
+            new_records = []
+            try:
+                for received in json_data[self._period]:
+                    if not self.collect_record(received, new_records):
+                        break
+            except KeyError as err:
+                _LOGGER.debug("Failed to read the JSON message using key %s", err)
+                return
+            self.update_records(new_records)
+
+    def collect_record(self, received, new_records):
+        """Add a received record, return False once the known records are reached."""
+        head_recid = self._history.head_recid
+        recid = received["recid"]
+        if head_recid is not None and recid < head_recid:
+            if new_records:
+                return False
+            # The newest record is older than the known head, the logger was
+            # reset or its clock jumped back. The known records are dropped
+            # and the full ring buffer is read again.
+            _LOGGER.warning(
+                "History of %s went back from %s to %s, reading it again",
+                self._period,
+                head_recid,
+                recid,
+            )
+            self._history = HistoryColumns()
+            head_recid = None
+        record = {field: received[field] for field in HISTORY_FIELDS}
+        record["recid"] = recid
+        new_records.append(record)
+        return recid != head_recid
+
+    def update_records(self, new_records):
+        """Merge the new records into the ring buffer and recalculate the usage."""
+        if not new_records or (
+            self._data is not None and self._history.matches(new_records)
+        ):
+            return
+        if self._history.head_recid is None:
+            # The first sync reads the full ring buffer, its length is
+            # the number of records we keep.
+            self._depth = len(new_records)
+        self._history = self._history.merge(new_records, self._depth)
+        self._usage = self._history.deltas(self._period)
+        self._data = {
+            f"{series}_{index}": usage[index]
+            for series, usage in self._usage.items()
+            for index in range(min(HISTORY_SENSORS, len(usage)))
+        }
+
+    async def async_update(self):
+        """Request the historical statistics from the DSMR logger."""
+        # The records are parsed while the body is read. Parsing stops at
+        # the newest record we already know, the rest of the ring buffer is
+        # only drained: a connection with unread data is closed instead of
+        # kept alive.
+        new_records = []
+        counter = ReadCounter()
+        start = time.monotonic()
+        try:
+            with async_timeout.timeout(REQUEST_TIMEOUT):
+                async with self._session.get(self.api) as response:
+                    response.raise_for_status()
+                    async for received in async_iter_json_array(
+                        response.content, self._period, counter=counter
+                    ):
+                        if not self.collect_record(received, new_records):
+                            break
+                    counter.size += len(await response.content.read())
+        except (asyncio.TimeoutError):
+            _LOGGER.error("Timeout connecting to the DSMR meter")
+            self.stats.record_timeout()
+            return False
+        except (ClientError) as err:
+            _LOGGER.error("Error retrieving DSMR data: %s", repr(err))
+            self.stats.record_client_error()
+            return False
+        except (KeyError, ValueError) as err:
+            _LOGGER.debug("Failed to read the JSON message: %s", repr(err))
+            self.stats.record_parse_error()
+            return False
+
+        self.stats.record_request(
+            time.monotonic() - start, counter.size, counter.parse_time
+        )
+        self.update_records(new_records)
+        self.fetched = dt_util.utcnow()
+        return True
@@ -0,0 +1,81 @@
+"""Circuit breaker for DSMR loggers that stopped answering."""
+import random
+import time
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# Consecutive failed polls before the breaker opens.
+FAILURE_THRESHOLD = 3
+# Time the breaker stays open the first time, it doubles every time the
+# logger is still unreachable, up to the maximum.
+BACKOFF_BASE = 30
+BACKOFF_MAX = 1800
+# Fraction of the backoff that is randomized, so a fleet of loggers that went
+# down together is not probed at the same moment.
+BACKOFF_JITTER = 0.2
+
+
+class CircuitBreaker:
+    """Stop polling a DSMR logger after repeated failures.
+
+    While the breaker is open no requests are made. Once the backoff has
+    passed the breaker is half open: one cheap probe decides whether polling
+    resumes (closed) or the breaker opens again with a longer backoff.
+    """
+
+    def __init__(
+        self,
+        threshold=FAILURE_THRESHOLD,
+        backoff_base=BACKOFF_BASE,
+        backoff_max=BACKOFF_MAX,
+        jitter=BACKOFF_JITTER,
+    ):
+        """Initialize a closed breaker."""
+        self.threshold = threshold
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.retry_at = None
+
+    def allow_request(self, now=None):
+        """Return True if the logger may be requested."""
+        if self.state == STATE_OPEN:
+            if (now if now is not None else time.monotonic()) < self.retry_at:
+                return False
+            self.state = STATE_HALF_OPEN
+        return True
+
+    @property
+    def half_open(self):
+        """Return True if the next request is a probe."""
+        return self.state == STATE_HALF_OPEN
+
+    def record_success(self):
+        """Close the breaker after a successful request."""
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.retry_at = None
+
+    def record_failure(self, now=None):
+        """Count a failed request, open the breaker when needed."""
+        self.failures += 1
+        if self.state == STATE_HALF_OPEN or self.failures >= self.threshold:
+            backoff = min(self.backoff_base * 2 ** self.opened, self.backoff_max)
+            backoff *= 1 + random.uniform(-self.jitter, self.jitter)
+            self.opened += 1
+            self.state = STATE_OPEN
+            self.retry_at = (now if now is not None else time.monotonic()) + backoff
+
+    def as_dict(self):
+        """Return the state of the breaker for diagnostics."""
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "opened": self.opened,
+        }
@@ -9,27 +9,70 @@ from aiohttp import ClientError
 
 import homeassistant.helpers.config_validation as cv
 from homeassistant import config_entries, core, exceptions
-from homeassistant.const import CONF_HOST
+from homeassistant.const import CONF_HOST, CONF_PORT
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.util import get_local_ip
 
 from .const import (
-    CONF_HISTORY_DAY,  # pylint:disable=unused-import
+    API_V1_DEV_INFO,
+    CONF_HISTORY_DAY,
     CONF_HISTORY_HOUR,
     CONF_HISTORY_MONTH,
+    CONF_HOSTS,
+    CONF_LIVE_INTERVAL,
+    CONF_MQTT_TOPIC,
+    CONF_P1_SOURCE,
+    CONF_STALE_TTL,
+    CONF_SUBNET,
+    DEFAULT_LIVE_INTERVAL,
+    DEFAULT_STALE_TTL,
     DOMAIN,
+    MAX_LIVE_INTERVAL,
+    MAX_PARALLEL_REQUESTS,
+    MAX_STALE_TTL,
+    MIN_LIVE_INTERVAL,
 )
+from .coordinator import config_p1_sources
+from .discovery import async_scan_subnet, default_subnet
+from .p1 import parse_p1_source
 
 _LOGGER = logging.getLogger(__name__)
 
 
 INPUT_SCHEMA = {
-    vol.Required(CONF_HOST): cv.string,
     vol.Optional(CONF_HISTORY_HOUR, default=False): cv.boolean,
     vol.Optional(CONF_HISTORY_DAY, default=False): cv.boolean,
     vol.Optional(CONF_HISTORY_MONTH, default=False): cv.boolean,
+    vol.Optional(CONF_LIVE_INTERVAL, default=DEFAULT_LIVE_INTERVAL): vol.All(
+        vol.Coerce(int), vol.Range(min=MIN_LIVE_INTERVAL, max=MAX_LIVE_INTERVAL)
+    ),
+    vol.Optional(CONF_STALE_TTL, default=DEFAULT_STALE_TTL): vol.All(
+        vol.Coerce(int), vol.Range(min=0, max=MAX_STALE_TTL)
+    ),
+    vol.Optional(CONF_MQTT_TOPIC, default=""): cv.string,
+    vol.Optional(CONF_P1_SOURCE, default=""): cv.string,
 }
 
 
+def p1_sources(value):
+    """Validate the P1 ports of the DSMR loggers, separated by commas."""
+    value = cv.string(value)
+    for source in value.split(","):
+        if source.strip():
+            try:
+                parse_p1_source(source.strip())
+            except ValueError as err:
+                raise vol.Invalid(str(err)) from err
+    return value
+
+
+def user_schema(host=""):
+    """Return the user form, the host is left empty to scan for DSMR loggers."""
+    return vol.Schema(
+        {vol.Optional(CONF_HOST, default=host): cv.string, **INPUT_SCHEMA}
+    )
+
+
 class DSMRSetup:
     """Test if the configuration to setup the dsmr connection is valid."""
 
@@ -40,7 +83,7 @@ class DSMRSetup:
 
     async def check_host(self) -> bool:
         """Test if we can authenticate with the host."""
-        dmsr_api_reply = self._host + "/api/v1/dev/info"
+        dmsr_api_reply = self._host + API_V1_DEV_INFO
 
         try:
             with async_timeout.timeout(10):
@@ -53,32 +96,117 @@ class DSMRSetup:
 
 async def validate_input(hass: core.HomeAssistant, data):
     """Validate the user input required to setup the connection."""
-    dsmr_setup = DSMRSetup(data["host"], hass)
-    if not await dsmr_setup.check_host():
+    # All DSMR loggers of the entry are checked at the same time. A meter
+    # read from its P1 port may not have a DSMR logger at all, it is only
+    # checked when its history is requested from the restAPI.
+    semaphore = asyncio.Semaphore(MAX_PARALLEL_REQUESTS)
+    p1_sources = config_p1_sources(data)
+    history = any(
+        data.get(key)
+        for key in (CONF_HISTORY_HOUR, CONF_HISTORY_DAY, CONF_HISTORY_MONTH)
+    )
+
+    async def check_host(host):
+        async with semaphore:
+            return await DSMRSetup(host, hass).check_host()
+
+    results = await asyncio.gather(
+        *[
+            check_host(host)
+            for host in data[CONF_HOSTS]
+            if history or not p1_sources[host]
+        ]
+    )
+    if not all(results):
         raise CannotConnect
     return {"title": "custom_dsmr"}
 
 
 def parse_host(host):
     """Format the url string into http://url."""
+    if "://" not in host:
+        host = "http://" + host
     return "http://" + urlparse(host).netloc
 
 
+def parse_hosts(hosts):
+    """Format a comma separated list of url strings into http://url's."""
+    return [parse_host(host.strip()) for host in hosts.split(",") if host.strip()]
+
+
 class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """Handle a config flow for custom dsmr."""
 
     VERSION = 1
     CONNECTION_CLASS = config_entries.CONN_CLASS_LOCAL_POLL
 
+    def __init__(self):
+        """Initialize the flow."""
+        # The hosts that were discovered, filled in on the user form.
+        self._host = ""
+
+    async def async_step_zeroconf(self, discovery_info):
+        """Handle a DSMR logger announced over mDNS."""
+        host = f"http://{discovery_info[CONF_HOST]}"
+        if discovery_info[CONF_PORT] not in (None, 80):
+            host = f"{host}:{discovery_info[CONF_PORT]}"
+        for entry in self._async_current_entries():
+            if host in entry.data.get(CONF_HOSTS, [entry.data.get(CONF_HOST)]):
+                return self.async_abort(reason="already_configured")
+        await self.async_set_unique_id(host)
+        self._abort_if_unique_id_configured()
+
+        self._host = host
+        self.context["title_placeholders"] = {"host": discovery_info[CONF_HOST]}
+        return await self.async_step_user()
+
+    async def async_step_scan(self, user_input=None):
+        """Scan a subnet for DSMR loggers."""
+        errors = {}
+
+        if user_input is not None:
+            try:
+                hosts = await async_scan_subnet(
+                    async_get_clientsession(self.hass), user_input[CONF_SUBNET]
+                )
+            except ValueError:
+                errors["base"] = "invalid_subnet"
+            else:
+                if hosts:
+                    self._host = ", ".join(hosts)
+                    return await self.async_step_user()
+                errors["base"] = "no_devices_found"
+
+        subnet = default_subnet(await self.hass.async_add_executor_job(get_local_ip))
+        return self.async_show_form(
+            step_id="scan",
+            data_schema=vol.Schema(
+                {vol.Required(CONF_SUBNET, default=subnet): cv.string}
+            ),
+            errors=errors,
+        )
+
     async def async_step_user(self, user_input=None):
         """Handle the initial step."""
         errors = {}
 
+        if user_input is not None and not user_input[CONF_HOST].strip():
+            return await self.async_step_scan()
+
         if user_input is not None:
             try:
-                user_input["host"] = parse_host(user_input["host"])
+                # The P1 ports are checked here instead of in the form schema,
+                # a schema error does not show up on the form.
+                p1_sources(user_input.get(CONF_P1_SOURCE, ""))
+                # More than one DSMR logger can be entered, separated by commas.
+                user_input[CONF_HOSTS] = parse_hosts(user_input[CONF_HOST])
+                if not user_input[CONF_HOSTS]:
+                    raise CannotConnect
+                user_input[CONF_HOST] = user_input[CONF_HOSTS][0]
                 info = await validate_input(self.hass, user_input)
                 return self.async_create_entry(title=info["title"], data=user_input)
+            except vol.Invalid:
+                errors[CONF_P1_SOURCE] = "invalid_p1_source"
             except CannotConnect:
                 errors["base"] = "cannot_connect"
             except Exception:  # pylint: disable=broad-except
@@ -87,7 +215,7 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
         return self.async_show_form(
             step_id="user",
-            data_schema=vol.Schema(INPUT_SCHEMA),
+            data_schema=user_schema(self._host),
             errors=errors,
         )
 
@@ -7,218 +7,166 @@ from homeassistant.const import (
     VOLUME_CUBIC_METERS,
 )
 
+from .registry import SensorDescription, SensorRegistry
+
 DOMAIN = "custom_dsmr"
+EVENT_DIAGNOSTICS = f"{DOMAIN}_diagnostics"
+EVENT_USAGE = f"{DOMAIN}_usage"
 PLATFORMS = ["sensor"]
 API_V1_ACTUAL = "/api/v1/sm/actual"
 API_V1_HIST_HOURS = "/api/v1/hist/hours"
 API_V1_HIST_DAYS = "/api/v1/hist/days"
 API_V1_HIST_MONTHS = "/api/v1/hist/months"
+API_V1_DEV_INFO = "/api/v1/dev/info"
 CONF_HISTORY_HOUR = "history_hour"
 CONF_HISTORY_DAY = "history_day"
 CONF_HISTORY_MONTH = "history_month"
+CONF_LIVE_INTERVAL = "live_interval"
+CONF_HOSTS = "hosts"
+CONF_STALE_TTL = "stale_ttl"
+CONF_MQTT_TOPIC = "mqtt_topic"
+CONF_P1_SOURCE = "p1_source"
+CONF_SUBNET = "subnet"
+ATTR_HISTORY = "history"
+ATTR_LAST_FETCHED = "last_fetched"
+ATTR_PERIOD = "period"
+ATTR_START = "start"
+ATTR_END = "end"
+SERVICE_DIAGNOSTICS = "diagnostics"
+SERVICE_QUERY_USAGE = "query_usage"
+SERVICE_REFRESH_HISTORY = "refresh_history"
+
+# The DSMR logger refreshes the actual readings with every telegram, which is
+# once every second for DSMR 5 meters and once every 10 seconds for DSMR 4.
+DEFAULT_LIVE_INTERVAL = 60
+MIN_LIVE_INTERVAL = 1
+MAX_LIVE_INTERVAL = 3600
+# Upper bound for the adaptive backoff of the live interval, as a multiple
+# of the configured interval.
+LIVE_BACKOFF_FACTOR = 8
+
+# Time the last received data is shown while the DSMR logger does not answer.
+DEFAULT_STALE_TTL = 300
+MAX_STALE_TTL = 86400
+
+# The history is requested once after the DSMR logger rolled over to the next
+# period. The request waits for the rollover delay plus a part of the spread
+# that differs per logger and period, a failed request is retried after a
+# few minutes.
+HISTORY_ROLLOVER_DELAY = 30
+HISTORY_SPREAD = 600
+HISTORY_RETRY = 300
+
+# Time the readings pushed by the DSMR logger are collected before the sensors
+# are updated, the logger publishes every reading as a separate message.
+PUSH_COALESCE_DELAY = 1
+
+# DSMR 4 and 5 meters send a telegram every 10 or every second at 115200 baud.
+# A connection that stays silent for longer than the read timeout is
+# reconnected.
+P1_BAUDRATE = 115200
+P1_READ_TIMEOUT = 30
+P1_RECONNECT_DELAY = 10
+
+# Time a single DSMR logger gets to answer a request.
+REQUEST_TIMEOUT = 10
+# Time an unreachable DSMR logger gets to answer the probe before polling
+# resumes.
+PROBE_TIMEOUT = 3
+# Number of requests a config entry with many DSMR loggers runs at once.
+MAX_PARALLEL_REQUESTS = 4
+
+# The ESP8266 web server of the DSMR logger only handles a few sockets and is
+# slow to set up a connection, so connections are kept open between polls.
+HOST_CONNECTION_LIMIT = 2
+KEEPALIVE_TIMEOUT = 75
+DNS_CACHE_TTL = 300
 
-SENSOR_FORMAT = {
-    "energy_delivered_tariff1": {
-        "name": "energy delivered tariff1",
-        "unit": ENERGY_KILO_WATT_HOUR,
-        "icon": "mdi:flash",
-        "utility": "energy",
-        "period": "actual",
-    },
-    "energy_delivered_tariff2": {
-        "name": "energy deliveredtariff2",
-        "unit": ENERGY_KILO_WATT_HOUR,
-        "icon": "mdi:flash",
-        "utility": "energy",
-        "period": "actual",
-    },
-    "energy_hours_delivered_0": {
-        "name": "energy hours delivered 0",
-        "unit": POWER_KILO_WATT,
-        "icon": "mdi:flash",
-        "utility": "energy",
-        "period": "hours",
-    },
-    "energy_hours_delivered_1": {
-        "name": "energy hours delivered 1",
-        "unit": POWER_KILO_WATT,
-        "icon": "mdi:flash",
-        "utility": "energy",
-        "period": "hours",
-    },
-    "energy_days_delivered_0": {
-        "name": "energy days delivered 0",
-        "unit": POWER_KILO_WATT,
-        "icon": "mdi:flash",
-        "utility": "energy",
-        "period": "days",
-    },
-    "energy_days_delivered_1": {
-        "name": "energy days delivered 1",
-        "unit": POWER_KILO_WATT,
-        "icon": "mdi:flash",
-        "utility": "energy",
-        "period": "months",
-    },
-    "energy_months_delivered_0": {
-        "name": "energy months delivered 0",
-        "unit": POWER_KILO_WATT,
-        "icon": "mdi:flash",
-        "utility": "energy",
-        "period": "months",
-    },
-    "energy_months_delivered_1": {
-        "name": "energy months delivered 1",
-        "unit": POWER_KILO_WATT,
-        "icon": "mdi:flash",
-        "utility": "energy",
-        "period": "months",
-    },
-    "energy_returned_tariff1": {
-        "name": "energy returned tariff 1",
-        "unit": ENERGY_KILO_WATT_HOUR,
-        "icon": "mdi:flash",
-        "utility": "energy",
-        "period": "actual",
-    },
-    "energy_returned_tariff2": {
-        "name": "energy returned tariff 2",
-        "unit": ENERGY_KILO_WATT_HOUR,
-        "icon": "mdi:flash",
-        "utility": "energy",
-        "period": "actual",
-    },
-    "energy_hours_returned_0": {
-        "name": "energy hours returned 0",
-        "unit": POWER_KILO_WATT,
-        "icon": "mdi:flash",
-        "utility": "energy",
-        "period": "hours",
-    },
-    "energy_hours_returned_1": {
-        "name": "energy hours returned 1",
-        "unit": POWER_KILO_WATT,
-        "icon": "mdi:flash",
-        "utility": "energy",
-        "period": "hours",
-    },
-    "energy_days_returned_0": {
-        "name": "energy days returned 0",
-        "unit": POWER_KILO_WATT,
-        "icon": "mdi:flash",
-        "utility": "energy",
-        "period": "days",
-    },
-    "energy_days_returned_1": {
-        "name": "energy days returned 1",
-        "unit": POWER_KILO_WATT,
-        "icon": "mdi:flash",
-        "utility": "energy",
-        "period": "days",
-    },
-    "energy_months_returned_0": {
-        "name": "energy months returned 0",
-        "unit": POWER_KILO_WATT,
-        "icon": "mdi:flash",
-        "utility": "energy",
-        "period": "months",
-    },
-    "energy_months_returned_1": {
-        "name": "energy months returned 1",
-        "unit": ENERGY_KILO_WATT_HOUR,
-        "icon": "mdi:flash",
-        "utility": "energy",
-        "period": "",
-    },
-    "power_delivered": {
-        "name": "power delivered",
-        "unit": POWER_KILO_WATT,
-        "icon": "mdi:flash",
-        "utility": "energy",
-        "period": "actual",
-    },
-    "power_returned": {
-        "name": "power returned",
-        "unit": POWER_KILO_WATT,
-        "icon": "mdi:flash",
-        "utility": "energy",
-        "period": "actual",
-    },
-    "voltage_l1": {
-        "name": "voltage l1",
-        "unit": VOLT,
-        "icon": "mdi:flash",
-        "utility": "energy",
-        "period": "actual",
-    },
-    "current_l1": {
-        "name": "current l1",
-        "unit": ELECTRICAL_CURRENT_AMPERE,
-        "icon": "mdi:flash",
-        "utility": "energy",
-        "period": "actual",
-    },
-    "power_delivered_l1": {
-        "name": "power delivered l1",
-        "unit": POWER_KILO_WATT,
-        "icon": "mdi:flash",
-        "utility": "energy",
-        "period": "actual",
-    },
-    "power_returned_l1": {
-        "name": "power returned l1",
-        "unit": POWER_KILO_WATT,
-        "icon": "mdi:flash",
-        "utility": "energy",
-        "period": "actual",
-    },
-    "gas_delivered": {
-        "name": "Gas delivered",
-        "unit": VOLUME_CUBIC_METERS,
-        "icon": "mdi:gas",
-        "utility": "gas",
-        "period": "actual",
-    },
-    "gas_hours_delivered_0": {
-        "name": "gas hours delivered 0",
-        "unit": VOLUME_CUBIC_METERS,
-        "icon": "mdi:gas",
-        "utility": "gas",
-        "period": "hours",
-    },
-    "gas_hours_delivered_1": {
-        "name": "gas hours delivered 1",
-        "unit": VOLUME_CUBIC_METERS,
-        "icon": "mdi:gas",
-        "utility": "gas",
-        "period": "hours",
-    },
-    "gas_days_delivered_0": {
-        "name": "gas days delivered 0",
-        "unit": VOLUME_CUBIC_METERS,
-        "icon": "mdi:gas",
-        "utility": "gas",
-        "period": "days",
-    },
-    "gas_days_delivered_1": {
-        "name": "gas days delivered 1",
-        "unit": VOLUME_CUBIC_METERS,
-        "icon": "mdi:gas",
-        "utility": "gas",
-        "period": "days",
-    },
-    "gas_months_delivered_0": {
-        "name": "gas months delivered 0",
-        "unit": VOLUME_CUBIC_METERS,
-        "icon": "mdi:gas",
-        "utility": "gas",
-        "period": "months",
-    },
-    "gas_months_delivered_1": {
-        "name": "gas months delivered 1",
-        "unit": VOLUME_CUBIC_METERS,
-        "icon": "mdi:gas",
-        "utility": "gas",
-        "period": "months",
-    },
-}
\ No newline at end of file
+# A subnet scan probes every address for the device info endpoint. A DSMR
+# logger on the local network answers well within the scan timeout, the
+# addresses without one do not hold up the scan for long.
+SCAN_TIMEOUT = 1
+SCAN_PARALLEL = 64
+MAX_SCAN_HOSTS = 1024
+
+# Every sensor is described by its key, unit, the utility it measures, the
+# period (restAPI) it is read from and an optional deadband. The name defaults
+# to the key. A new reading only needs a line in this table. The running
+# period (*_0) follows the live readings, its deadband keeps it from writing
+# a state on every poll.
+
+
+def _energy(key, unit, period, **kwargs):
+    """Describe an electricity sensor."""
+    return SensorDescription(key, unit, "mdi:flash", "energy", period, **kwargs)
+
+
+def _gas(key, period, **kwargs):
+    """Describe a gas sensor."""
+    return SensorDescription(
+        key, VOLUME_CUBIC_METERS, "mdi:gas", "gas", period, **kwargs
+    )
+
+
+SENSOR_FORMAT = SensorRegistry(
+    [
+        _energy("energy_delivered_tariff1", ENERGY_KILO_WATT_HOUR, "actual"),
+        _energy(
+            "energy_delivered_tariff2",
+            ENERGY_KILO_WATT_HOUR,
+            "actual",
+            name="energy deliveredtariff2",
+        ),
+        _energy("energy_hours_delivered_0", POWER_KILO_WATT, "hours", deadband=0.01),
+        _energy("energy_hours_delivered_1", POWER_KILO_WATT, "hours"),
+        _energy("energy_days_delivered_0", POWER_KILO_WATT, "days", deadband=0.01),
+        _energy("energy_days_delivered_1", POWER_KILO_WATT, "days"),
+        _energy("energy_months_delivered_0", POWER_KILO_WATT, "months", deadband=0.01),
+        _energy("energy_months_delivered_1", POWER_KILO_WATT, "months"),
+        _energy(
+            "energy_returned_tariff1",
+            ENERGY_KILO_WATT_HOUR,
+            "actual",
+            name="energy returned tariff 1",
+        ),
+        _energy(
+            "energy_returned_tariff2",
+            ENERGY_KILO_WATT_HOUR,
+            "actual",
+            name="energy returned tariff 2",
+        ),
+        _energy("energy_hours_returned_0", POWER_KILO_WATT, "hours", deadband=0.01),
+        _energy("energy_hours_returned_1", POWER_KILO_WATT, "hours"),
+        _energy("energy_days_returned_0", POWER_KILO_WATT, "days", deadband=0.01),
+        _energy("energy_days_returned_1", POWER_KILO_WATT, "days"),
+        _energy("energy_months_returned_0", POWER_KILO_WATT, "months", deadband=0.01),
+        _energy("energy_months_returned_1", POWER_KILO_WATT, "months"),
+        _energy("power_delivered", POWER_KILO_WATT, "actual", deadband=0.01),
+        _energy("power_returned", POWER_KILO_WATT, "actual", deadband=0.01),
+        _energy("voltage_l1", VOLT, "actual", deadband=0.5),
+        _energy("current_l1", ELECTRICAL_CURRENT_AMPERE, "actual"),
+        _energy("power_delivered_l1", POWER_KILO_WATT, "actual", deadband=0.01),
+        _energy("power_returned_l1", POWER_KILO_WATT, "actual", deadband=0.01),
+        _energy("voltage_l2", VOLT, "actual", deadband=0.5),
+        _energy("current_l2", ELECTRICAL_CURRENT_AMPERE, "actual"),
+        _energy("power_delivered_l2", POWER_KILO_WATT, "actual", deadband=0.01),
+        _energy("power_returned_l2", POWER_KILO_WATT, "actual", deadband=0.01),
+        _energy("voltage_l3", VOLT, "actual", deadband=0.5),
+        _energy("current_l3", ELECTRICAL_CURRENT_AMPERE, "actual"),
+        _energy("power_delivered_l3", POWER_KILO_WATT, "actual", deadband=0.01),
+        _energy("power_returned_l3", POWER_KILO_WATT, "actual", deadband=0.01),
+        _energy("net_power", POWER_KILO_WATT, "derived", deadband=0.01),
+        _energy("energy_delivered_total", ENERGY_KILO_WATT_HOUR, "derived"),
+        _energy("energy_returned_total", ENERGY_KILO_WATT_HOUR, "derived"),
+        _energy("net_energy", ENERGY_KILO_WATT_HOUR, "derived"),
+        _energy("average_demand", POWER_KILO_WATT, "derived", deadband=0.01),
+        _energy("peak_demand", POWER_KILO_WATT, "derived"),
+        _gas("gas_delivered", "actual", name="Gas delivered"),
+        _gas("gas_hours_delivered_0", "hours", deadband=0.01),
+        _gas("gas_hours_delivered_1", "hours"),
+        _gas("gas_days_delivered_0", "days", deadband=0.01),
+        _gas("gas_days_delivered_1", "days"),
+        _gas("gas_months_delivered_0", "months", deadband=0.01),
+        _gas("gas_months_delivered_1", "months"),
+    ]
+)
@@ -0,0 +1,371 @@
+"""Update coordinator for the custom dsmr integration."""
+import asyncio
+import logging
+import time
+from datetime import timedelta
+
+from homeassistant.const import CONF_HOST
+from homeassistant.core import callback
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from homeassistant.util import dt as dt_util
+
+from .api import DSMRHistData, DSMRLiveData, async_probe
+from .breaker import CircuitBreaker
+from .const import (
+    API_V1_ACTUAL,
+    API_V1_DEV_INFO,
+    API_V1_HIST_DAYS,
+    API_V1_HIST_HOURS,
+    API_V1_HIST_MONTHS,
+    CONF_HISTORY_DAY,
+    CONF_HISTORY_HOUR,
+    CONF_HISTORY_MONTH,
+    CONF_HOSTS,
+    CONF_LIVE_INTERVAL,
+    CONF_MQTT_TOPIC,
+    CONF_P1_SOURCE,
+    CONF_STALE_TTL,
+    DEFAULT_LIVE_INTERVAL,
+    DEFAULT_STALE_TTL,
+    DOMAIN,
+    HOST_CONNECTION_LIMIT,
+    LIVE_BACKOFF_FACTOR,
+)
+from .derived import DerivedMetrics
+from .p1 import P1Listener
+from .push import DSMRPushListener
+from .schedule import HistorySchedule
+from .store import HistoryStore, store_path
+
+_LOGGER = logging.getLogger(__name__)
+
+HISTORY_ENDPOINTS = {
+    CONF_HISTORY_HOUR: ("hours", API_V1_HIST_HOURS),
+    CONF_HISTORY_DAY: ("days", API_V1_HIST_DAYS),
+    CONF_HISTORY_MONTH: ("months", API_V1_HIST_MONTHS),
+}
+
+
+def config_hosts(config):
+    """Return the DSMR loggers of a config entry."""
+    return config.get(CONF_HOSTS) or [config[CONF_HOST]]
+
+
+def _config_per_host(config, key):
+    """Return the comma separated values of an option for every DSMR logger.
+
+    The values are entered like the hosts, separated by commas and in the
+    same order. A logger without a value gets None.
+    """
+    values = [value.strip() for value in config.get(key, "").split(",")]
+    hosts = config_hosts(config)
+    values += [""] * (len(hosts) - len(values))
+    return {host: value or None for host, value in zip(hosts, values)}
+
+
+def config_topics(config):
+    """Return the MQTT topic of every DSMR logger of a config entry."""
+    return _config_per_host(config, CONF_MQTT_TOPIC)
+
+
+def config_p1_sources(config):
+    """Return the P1 port of every DSMR logger of a config entry."""
+    return _config_per_host(config, CONF_P1_SOURCE)
+
+
+class DSMRCoordinator(DataUpdateCoordinator):
+    """Poll all endpoints of one DSMR logger and share the result."""
+
+    def __init__(
+        self,
+        hass,
+        session,
+        config,
+        host=None,
+        semaphore=None,
+        topic=None,
+        p1_source=None,
+    ):
+        """Initialize the coordinator and the data objects it owns."""
+        self.host = host or config[CONF_HOST]
+        self.config = config
+        self.session = session
+        # A config entry can hold many DSMR loggers, the semaphore shared by
+        # their coordinators limits the number of requests running at once.
+        self._semaphore = semaphore or asyncio.Semaphore(1)
+        # The web server of the DSMR logger only handles a few requests at
+        # once. Requests wait for their turn here instead of in the
+        # connection pool, where the wait would count towards their timeout.
+        self._host_semaphore = asyncio.Semaphore(HOST_CONNECTION_LIMIT)
+        self.live_data = DSMRLiveData(session, self.host + API_V1_ACTUAL)
+        self.endpoints = {API_V1_ACTUAL: self.live_data}
+
+        # The history endpoints are optional. Each period has its own
+        # schedule, it is only requested after the DSMR logger rolled over
+        # to the next period even though the coordinator runs at the live
+        # interval.
+        self.hist_data = {}
+        self.schedules = {}
+        for conf_key, (period, api) in HISTORY_ENDPOINTS.items():
+            if config.get(conf_key):
+                self.hist_data[period] = DSMRHistData(session, self.host + api, period)
+                self.endpoints[api] = self.hist_data[period]
+                self.schedules[period] = HistorySchedule(self.host, period)
+
+        # The records the ring buffer of the DSMR logger evicts are kept in a
+        # local store per period.
+        self.stores = {
+            period: HistoryStore(store_path(hass, self.host, period))
+            for period in self.hist_data
+        }
+        self._stored_heads = {}
+        self.derived = DerivedMetrics()
+
+        # The configured live interval is the fastest we poll, the actual
+        # interval backs off when the DSMR logger can not keep up.
+        self.live_interval = timedelta(
+            seconds=config.get(CONF_LIVE_INTERVAL, DEFAULT_LIVE_INTERVAL)
+        )
+        self._last_timestamp = None
+        self.breaker = CircuitBreaker()
+        # The last snapshot is served while the logger does not answer, until
+        # it is older than the stale ttl.
+        self.stale_ttl = timedelta(
+            seconds=config.get(CONF_STALE_TTL, DEFAULT_STALE_TTL)
+        )
+        # A DSMR logger that publishes its readings over MQTT, or a meter
+        # that is read directly from its P1 port, is not polled for live
+        # data. The coordinator only polls the history.
+        self.push = None
+        self._push_started = None
+        # The listeners added besides the entities, removed when the config
+        # entry is unloaded.
+        self.unsub_listeners = []
+        if p1_source:
+            self.push = P1Listener(hass, p1_source, self.async_push)
+        elif topic:
+            self.push = DSMRPushListener(hass, topic, self.async_push)
+
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=f"{DOMAIN} {self.host}",
+            update_interval=self.live_interval,
+        )
+
+    @property
+    def periods(self):
+        """Return the periods polled by this coordinator, including the live one."""
+        return ["actual"] + list(self.hist_data)
+
+    def fetched(self, period):
+        """Return when the data of a period was last received."""
+        return self.hist_data.get(period, self.live_data).fetched
+
+    def serve_stale(self, message):
+        """Return the last snapshot if it is recent enough, fail otherwise."""
+        fetched = self.live_data.fetched
+        if self.data is not None and fetched is not None:
+            if dt_util.utcnow() - fetched < self.stale_ttl:
+                _LOGGER.debug("%s, serving the data received at %s", message, fetched)
+                return self.data
+        raise UpdateFailed(message)
+
+    async def async_start_push(self):
+        """Start listening to the readings pushed by the DSMR logger."""
+        if self.push is not None:
+            self._push_started = dt_util.utcnow()
+            await self.push.async_start()
+
+    @callback
+    def async_stop_push(self):
+        """Stop listening to the readings pushed by the DSMR logger."""
+        if self.push is not None:
+            self.push.async_stop()
+
+    async def async_close_session(self, event=None):
+        """Close the client session of the DSMR logger."""
+        await self.session.close()
+
+    @callback
+    def async_update_listeners(self):
+        """Hand the current data to all listeners without a refresh."""
+        # Home Assistant 0.118 only updates the listeners at the end of a
+        # refresh or from async_set_updated_data, which also reschedules the
+        # next refresh. A listener can add sensors, so a copy is iterated.
+        for update_callback in list(self._listeners):
+            update_callback()
+
+    @callback
+    def async_push(self, readings):
+        """Update the sensors with readings pushed by the DSMR logger."""
+        self.live_data.update_pushed(readings)
+        snapshot = self.build_snapshot()
+        if snapshot == self.data and self.last_update_success:
+            return
+        # The data is set without going through async_set_updated_data, that
+        # would reschedule the next poll and starve the history at push rate.
+        self.data = snapshot
+        self.last_update_success = True
+        self.async_update_listeners()
+
+    async def async_update_history(self):
+        """Request the history periods that are due and store their records."""
+        now = dt_util.utcnow()
+        await asyncio.gather(
+            *[
+                self._async_update_period(period)
+                for period, schedule in self.schedules.items()
+                if schedule.due(now)
+            ]
+        )
+        await self.async_store_history()
+
+    async def _async_update_period(self, period):
+        """Request the history of one period and plan the next request."""
+        hist_data = self.hist_data[period]
+        async with self._host_semaphore, self._semaphore:
+            received = await hist_data.async_update()
+        self.schedules[period].record(
+            dt_util.utcnow(), received, hist_data.history.head_recid
+        )
+        if received:
+            self.async_publish_partial()
+
+    @callback
+    def async_publish_partial(self):
+        """Hand the sensors the responses received so far in this update.
+
+        The endpoints of one update are requested at the same time, a
+        response is published as soon as it arrives instead of after the
+        slowest one. The snapshot the update returns is then equal to the
+        published one and does not write the states again.
+        """
+        if self.data is None or not self.last_update_success:
+            return
+        snapshot = self.build_snapshot()
+        if snapshot != self.data:
+            self.data = snapshot
+            self.async_update_listeners()
+
+    async def _async_update_live(self):
+        """Request the live data, return if it was received and the latency."""
+        # The latency is measured once it is our turn, waiting for the
+        # history requests of this logger does not slow the live interval.
+        async with self._host_semaphore, self._semaphore:
+            start = time.monotonic()
+            received = await self.live_data.async_update()
+            latency = time.monotonic() - start
+        if received:
+            self.async_publish_partial()
+        return received, latency
+
+    async def async_refresh_history(self, periods=None):
+        """Request the history now instead of after the next rollover."""
+        for period, schedule in self.schedules.items():
+            if periods is None or period in periods:
+                schedule.force()
+        await self.async_request_refresh()
+
+    async def async_store_history(self):
+        """Append the history records that became final to the local store."""
+        # The records only become final when the newest record moves on,
+        # which is once per period.
+        for period, hist_data in self.hist_data.items():
+            head_recid = hist_data.history.head_recid
+            if head_recid is None or head_recid == self._stored_heads.get(period):
+                continue
+            try:
+                await self.hass.async_add_executor_job(
+                    self.stores[period].append, hist_data.history
+                )
+            except OSError as err:
+                _LOGGER.error("Error storing the %s history: %s", period, err)
+                continue
+            self._stored_heads[period] = head_recid
+
+    def build_snapshot(self):
+        """Merge the data objects into one flat sensor -> value mapping."""
+        now = dt_util.utcnow()
+        snapshot = dict(self.live_data.data or {})
+        snapshot.update(self.derived.update(self.live_data.data, now))
+        for period, hist_data in self.hist_data.items():
+            # Between two rollovers the cached history is served, only the
+            # running period follows the live readings.
+            if self.schedules[period].current(now):
+                hist_data.update_running(self.live_data.data)
+            if hist_data.data is not None:
+                snapshot.update(hist_data.data)
+        return snapshot
+
+    def adapt_interval(self, latency, timestamp):
+        """Back off or speed up the live interval based on the last request."""
+        # The interval is doubled when the DSMR logger returned the telegram
+        # we already had, or when answering took longer than half of the
+        # interval. Otherwise it slowly returns to the configured interval.
+        interval = self.update_interval
+        max_interval = self.live_interval * LIVE_BACKOFF_FACTOR
+        if timestamp is not None and timestamp == self._last_timestamp:
+            interval = min(interval * 2, max_interval)
+        elif latency > interval.total_seconds() / 2:
+            interval = min(
+                max(interval * 2, timedelta(seconds=latency * 2)), max_interval
+            )
+        else:
+            interval = max(interval * 3 / 4, self.live_interval)
+
+        if interval != self.update_interval:
+            _LOGGER.debug("Live interval of %s set to %s", self.host, interval)
+        self.update_interval = interval
+        self._last_timestamp = timestamp
+
+    async def _async_update_pushed_data(self):
+        """Request the history and check the DSMR logger is still pushing."""
+        await self.async_update_history()
+
+        last_push = self.live_data.fetched or self._push_started
+        if last_push is not None and dt_util.utcnow() - last_push > self.stale_ttl:
+            raise UpdateFailed(f"{self.host} stopped pushing its readings")
+
+        snapshot = self.build_snapshot()
+        if snapshot == self.data:
+            return self.data
+        return snapshot
+
+    async def _async_update_data(self):
+        """Request every endpoint once and return the merged snapshot."""
+        if self.push is not None:
+            return await self._async_update_pushed_data()
+
+        # A DSMR logger that stopped answering is left alone until the
+        # breaker allows a probe of the (cheap) device info endpoint.
+        if not self.breaker.allow_request():
+            return self.serve_stale(f"{self.host} is unreachable, polling is paused")
+        if self.breaker.half_open:
+            async with self._host_semaphore, self._semaphore:
+                reachable = await async_probe(self.session, self.host + API_V1_DEV_INFO)
+            if not reachable:
+                self.breaker.record_failure()
+                return self.serve_stale(f"{self.host} is still unreachable")
+
+        # The live data and the history that is due are requested at once,
+        # an update takes as long as its slowest request.
+        (received, latency), _ = await asyncio.gather(
+            self._async_update_live(), self.async_update_history()
+        )
+        if not received:
+            self.breaker.record_failure()
+            self.update_interval = min(
+                self.update_interval * 2, self.live_interval * LIVE_BACKOFF_FACTOR
+            )
+            return self.serve_stale(f"No live data received from {self.host}")
+        self.breaker.record_success()
+
+        snapshot = self.build_snapshot()
+        self.adapt_interval(latency, snapshot.get("timestamp"))
+
+        # Hand the previous snapshot back when nothing changed, the sensors
+        # use this to skip writing an identical state.
+        if snapshot == self.data:
+            return self.data
+        return snapshot
@@ -0,0 +1,131 @@
+"""Metrics derived from the live readings of the DSMR logger."""
+from collections import deque
+from datetime import timedelta
+
+from homeassistant.util import dt as dt_util
+
+# The average demand is taken over the last 15 minutes, the window of the
+# capacity tariff. The samples are kept in a ring buffer large enough for a
+# DSMR 5 meter that sends a telegram every second.
+DEMAND_WINDOW = timedelta(minutes=15)
+DEMAND_SAMPLES = 900
+
+
+def _total(live, *fields):
+    """Return the sum of the readings, None if one of them is missing."""
+    try:
+        return sum(float(live[field]) for field in fields)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _month(moment):
+    """Return the year and month of the moment in the local time zone."""
+    local = dt_util.as_local(moment)
+    return (local.year, local.month)
+
+
+class DerivedMetrics:
+    """Calculate the derived metrics in one pass over the live readings.
+
+    Net power, the totals over both tariffs, the average demand over the
+    last 15 minutes and the peak of the 15 minute demand of this month,
+    measured over quarter hours like the capacity tariff does.
+    """
+
+    def __init__(self, window=DEMAND_WINDOW, samples=DEMAND_SAMPLES):
+        """Initialize the ring buffer and the monthly peak."""
+        self._window = window.total_seconds()
+        self._samples = deque(maxlen=samples)
+        self._quarter = None
+        self._quarter_start = None
+        self._peak = None
+        self._peak_month = None
+        self._live = None
+        self._derived = {}
+
+    def update(self, live, now):
+        """Return the metrics derived from the live readings received at now."""
+        # The live readings are a new dict with every telegram, the metrics
+        # of a telegram are calculated once.
+        if not live or live is self._live:
+            return self._derived
+        self._live = live
+
+        derived = {}
+        delivered = _total(live, "energy_delivered_tariff1", "energy_delivered_tariff2")
+        returned = _total(live, "energy_returned_tariff1", "energy_returned_tariff2")
+        net_power = _total(live, "power_delivered")
+        power_returned = _total(live, "power_returned")
+        if net_power is not None and power_returned is not None:
+            derived["net_power"] = round(net_power - power_returned, 3)
+        if delivered is not None:
+            derived["energy_delivered_total"] = round(delivered, 3)
+            derived.update(self._demand(delivered, now))
+        if returned is not None:
+            derived["energy_returned_total"] = round(returned, 3)
+        if delivered is not None and returned is not None:
+            derived["net_energy"] = round(delivered - returned, 3)
+        self._derived = derived
+        return derived
+
+    def _demand(self, delivered, now):
+        """Return the average and peak demand from the delivered energy."""
+        demand = {}
+        seconds = now.timestamp()
+        samples = self._samples
+        samples.append((seconds, delivered))
+        while seconds - samples[0][0] > self._window:
+            samples.popleft()
+        first_seconds, first_delivered = samples[0]
+        if seconds > first_seconds:
+            demand["average_demand"] = round(
+                (delivered - first_delivered) * 3600 / (seconds - first_seconds), 3
+            )
+
+        # The capacity tariff uses the quarter hours of the clock, the demand
+        # of a quarter hour is known once the next one starts.
+        local = dt_util.as_local(now)
+        quarter = (local.year, local.month, local.day, local.hour, local.minute // 15)
+        if quarter != self._quarter:
+            if self._quarter_start is not None:
+                start_seconds, start_delivered = self._quarter_start
+                elapsed = seconds - start_seconds
+                if 0 < elapsed <= self._window * 2:
+                    self._record_peak(
+                        self._quarter[:2],
+                        (delivered - start_delivered) * 3600 / elapsed,
+                    )
+            self._quarter = quarter
+            self._quarter_start = (seconds, delivered)
+        if self._peak is not None:
+            demand["peak_demand"] = round(self._peak, 3)
+        return demand
+
+    def restore(self, key, value, moment, now):
+        """Take the restored state of a derived sensor last changed at moment.
+
+        Only the monthly peak is kept across a restart, as long as it was
+        reached in the month of now. The other metrics follow the readings.
+        """
+        if key != "peak_demand":
+            return
+        try:
+            peak = float(value)
+        except (TypeError, ValueError):
+            return
+        month = _month(moment)
+        if month != _month(now):
+            return
+        if month == self._peak_month:
+            peak = max(self._peak, peak)
+        self._peak_month = month
+        self._peak = peak
+
+    def _record_peak(self, month, quarter_demand):
+        """Keep the highest quarter hour demand of the month."""
+        if month != self._peak_month:
+            self._peak_month = month
+            self._peak = quarter_demand
+        else:
+            self._peak = max(self._peak, quarter_demand)
@@ -0,0 +1,31 @@
+"""Diagnostics of the custom dsmr integration."""
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
+
+from .const import DOMAIN
+
+
+@callback
+def async_get_diagnostics(hass: HomeAssistant, entry: ConfigEntry):
+    """Return the request statistics of every DSMR logger of the entry."""
+    coordinators = hass.data[DOMAIN][entry.entry_id]
+    return {
+        "entry_id": entry.entry_id,
+        "config": dict(entry.data),
+        "loggers": {
+            host: {
+                "last_update_success": coordinator.last_update_success,
+                "update_interval": coordinator.update_interval.total_seconds(),
+                "breaker": coordinator.breaker.as_dict(),
+                "history_schedule": {
+                    period: schedule.as_dict()
+                    for period, schedule in coordinator.schedules.items()
+                },
+                "endpoints": {
+                    endpoint: data.stats.as_dict()
+                    for endpoint, data in coordinator.endpoints.items()
+                },
+            }
+            for host, coordinator in coordinators.items()
+        },
+    }
@@ -0,0 +1,41 @@
+"""Find the DSMR loggers on the local network."""
+import asyncio
+import ipaddress
+import logging
+
+from .api import async_probe
+from .const import API_V1_DEV_INFO, MAX_SCAN_HOSTS, SCAN_PARALLEL, SCAN_TIMEOUT
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def default_subnet(ip_address):
+    """Return the /24 subnet around an address, the usual home network."""
+    return str(ipaddress.ip_network(f"{ip_address}/24", strict=False))
+
+
+async def async_scan_subnet(
+    session, subnet, timeout=SCAN_TIMEOUT, parallel=SCAN_PARALLEL
+):
+    """Return the urls of the DSMR loggers that answer in a subnet.
+
+    Every address is probed for the device info endpoint with a short
+    timeout, at most parallel addresses at once. Raises ValueError for a
+    subnet that is not valid or too large to scan.
+    """
+    network = ipaddress.ip_network(subnet, strict=False)
+    if network.num_addresses > MAX_SCAN_HOSTS:
+        raise ValueError(f"Subnet {subnet} has more than {MAX_SCAN_HOSTS} addresses")
+    semaphore = asyncio.Semaphore(parallel)
+
+    async def probe(address):
+        async with semaphore:
+            return await async_probe(
+                session, f"http://{address}{API_V1_DEV_INFO}", timeout
+            )
+
+    addresses = list(network.hosts())
+    results = await asyncio.gather(*[probe(address) for address in addresses])
+    hosts = [f"http://{address}" for address, found in zip(addresses, results) if found]
+    _LOGGER.debug("Found %d DSMR loggers in %s", len(hosts), subnet)
+    return hosts
@@ -0,0 +1,106 @@
+"""Column store for the history ring buffers of the DSMR logger."""
+from array import array
+
+# The meter readings kept from every history record.
+HISTORY_FIELDS = ("edt1", "edt2", "ert1", "ert2", "gdt")
+
+# The live reading of the running total of every history field.
+HISTORY_READINGS = {
+    "edt1": "energy_delivered_tariff1",
+    "edt2": "energy_delivered_tariff2",
+    "ert1": "energy_returned_tariff1",
+    "ert2": "energy_returned_tariff2",
+    "gdt": "gas_delivered",
+}
+
+# Every usage series is the sum of one or more running totals.
+HISTORY_SERIES = {
+    "energy_{}_delivered": ("edt1", "edt2"),
+    "energy_{}_returned": ("ert1", "ert2"),
+    "gas_{}_delivered": ("gdt",),
+}
+
+
+class HistoryColumns:
+    """The records of one history period, newest first, stored per field."""
+
+    __slots__ = ("recids", "columns")
+
+    def __init__(self, recids=None, columns=None):
+        """Initialize the (empty) columns."""
+        self.recids = recids if recids is not None else []
+        self.columns = columns or {field: array("d") for field in HISTORY_FIELDS}
+
+    def __len__(self):
+        """Return the number of records."""
+        return len(self.recids)
+
+    @property
+    def head_recid(self):
+        """Return the recid of the newest record."""
+        return self.recids[0] if self.recids else None
+
+    def matches(self, records):
+        """Return True if the records equal the newest known records."""
+        if len(records) > len(self.recids):
+            return False
+        return all(
+            record["recid"] == self.recids[index]
+            and all(
+                record[field] == self.columns[field][index] for field in HISTORY_FIELDS
+            )
+            for index, record in enumerate(records)
+        )
+
+    def merge(self, records, max_length):
+        """Return new columns with the records put in front of the known ones."""
+        # The records are newest first. Every known record that is not older
+        # than the last new record has been replaced by the new records.
+        oldest_recid = records[-1]["recid"]
+        keep_from = next(
+            (index for index, recid in enumerate(self.recids) if recid < oldest_recid),
+            len(self.recids),
+        )
+        recids = [record["recid"] for record in records] + self.recids[keep_from:]
+        columns = {}
+        for field in HISTORY_FIELDS:
+            column = array("d", [record[field] for record in records])
+            column.extend(self.columns[field][keep_from:])
+            columns[field] = column[:max_length]
+        return HistoryColumns(recids[:max_length], columns)
+
+    def totals(self, fields):
+        """Return the sum of the running totals of the given fields per record."""
+        if len(fields) == 1:
+            return self.columns[fields[0]]
+        return array("d", map(sum, zip(*(self.columns[field] for field in fields))))
+
+    def live_deltas(self, period, readings):
+        """Return the usage of the running period up to the live readings."""
+        # The running period started at the running totals of the record
+        # before the newest one.
+        usage = {}
+        if len(self.recids) < 2:
+            return usage
+        for series, fields in HISTORY_SERIES.items():
+            try:
+                total = sum(
+                    float(readings[HISTORY_READINGS[field]]) for field in fields
+                )
+            except (KeyError, TypeError, ValueError):
+                continue
+            start = sum(self.columns[field][1] for field in fields)
+            usage[f"{series.format(period)}_0"] = total - start
+        return usage
+
+    def deltas(self, period):
+        """Return the usage per record for every series of the period."""
+        # The usage of a record is its running total minus the running total
+        # of the record before it, the oldest record has no usage.
+        usage = {}
+        for series, fields in HISTORY_SERIES.items():
+            totals = self.totals(fields)
+            usage[series.format(period)] = array(
+                "d", map(float.__sub__, totals, totals[1:])
+            )
+        return usage
@@ -0,0 +1,118 @@
+"""Parser for the P1 telegrams sent by DSMR meters."""
+
+# Every line of a telegram starts with an OBIS code, followed by one or more
+# values in parentheses. The values are looked up by the OBIS code of the
+# line, only the codes we have a sensor for are read. The converter turns the
+# last value of the line into the value the restAPI of the DSMR logger
+# reports.
+#
+# E.G.: 1-0:1.8.1(001234.567*kWh) -> energy_delivered_tariff1 = 1234.567
+
+
+def _number(value):
+    """Return the number of a value without its unit."""
+    return float(value.split(b"*", 1)[0])
+
+
+def _text(value):
+    """Return a value as text."""
+    return value.decode("ascii")
+
+
+OBIS_FIELDS = {
+    b"0-0:1.0.0": ("timestamp", _text),
+    b"1-0:1.8.1": ("energy_delivered_tariff1", _number),
+    b"1-0:1.8.2": ("energy_delivered_tariff2", _number),
+    b"1-0:2.8.1": ("energy_returned_tariff1", _number),
+    b"1-0:2.8.2": ("energy_returned_tariff2", _number),
+    b"1-0:1.7.0": ("power_delivered", _number),
+    b"1-0:2.7.0": ("power_returned", _number),
+    b"1-0:32.7.0": ("voltage_l1", _number),
+    b"1-0:31.7.0": ("current_l1", _number),
+    b"1-0:21.7.0": ("power_delivered_l1", _number),
+    b"1-0:22.7.0": ("power_returned_l1", _number),
+    b"1-0:52.7.0": ("voltage_l2", _number),
+    b"1-0:51.7.0": ("current_l2", _number),
+    b"1-0:41.7.0": ("power_delivered_l2", _number),
+    b"1-0:42.7.0": ("power_returned_l2", _number),
+    b"1-0:72.7.0": ("voltage_l3", _number),
+    b"1-0:71.7.0": ("current_l3", _number),
+    b"1-0:61.7.0": ("power_delivered_l3", _number),
+    b"1-0:62.7.0": ("power_returned_l3", _number),
+}
+# The gas meter is connected to one of the four M-Bus channels of the meter.
+OBIS_FIELDS.update(
+    {
+        f"0-{channel}:24.2.1".encode(): ("gas_delivered", _number)
+        for channel in range(1, 5)
+    }
+)
+
+TELEGRAM_START = b"/"
+TELEGRAM_END = b"!"
+
+
+def _crc16_table():
+    """Return the lookup table of the CRC16 (ARC) of the DSMR 4 and 5 telegrams."""
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_CRC16_TABLE = _crc16_table()
+
+
+def crc16(data):
+    """Return the CRC16 (ARC) of the data."""
+    crc = 0
+    for byte in data:
+        crc = (crc >> 8) ^ _CRC16_TABLE[(crc ^ byte) & 0xFF]
+    return crc
+
+
+class TelegramError(ValueError):
+    """Error to indicate a telegram is incomplete or corrupted."""
+
+
+def check_telegram(telegram):
+    """Raise TelegramError if the telegram is incomplete or its CRC is wrong.
+
+    The CRC covers everything from the start of the telegram up to and
+    including the "!". DSMR 2 and 3 telegrams end without a CRC.
+    """
+    if not telegram.startswith(TELEGRAM_START):
+        raise TelegramError("Telegram does not start with /")
+    end = telegram.rfind(TELEGRAM_END)
+    if end == -1:
+        raise TelegramError("Telegram does not end with !")
+    checksum = telegram[end + 1 :].strip()
+    if not checksum:
+        return
+    try:
+        expected = int(checksum, 16)
+    except ValueError as err:
+        raise TelegramError(f"Invalid CRC {checksum!r}") from err
+    if crc16(telegram[: end + 1]) != expected:
+        raise TelegramError(f"CRC {checksum.decode()} does not match the telegram")
+
+
+def parse_telegram(telegram):
+    """Return the readings of a telegram we have a sensor for."""
+    check_telegram(telegram)
+    readings = {}
+    for line in telegram.split(b"\n"):
+        start = line.find(b"(")
+        field = OBIS_FIELDS.get(line[:start]) if start > 0 else None
+        if field is None:
+            continue
+        name, convert = field
+        value = line[line.rfind(b"(") + 1 : line.rfind(b")")]
+        try:
+            readings[name] = convert(value)
+        except ValueError:
+            continue
+    return readings
@@ -0,0 +1,134 @@
+"""Read P1 telegrams from a serial port or a P1-to-TCP bridge."""
+import asyncio
+import logging
+
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import callback
+
+from .const import P1_BAUDRATE, P1_READ_TIMEOUT, P1_RECONNECT_DELAY
+from .obis import TELEGRAM_END, TELEGRAM_START, TelegramError, parse_telegram
+
+_LOGGER = logging.getLogger(__name__)
+
+
+async def async_read_telegram(reader):
+    """Read the next complete telegram from the stream."""
+    # Anything before the start of a telegram is the tail of a telegram we
+    # connected halfway through.
+    await reader.readuntil(TELEGRAM_START)
+    body = await reader.readuntil(TELEGRAM_END)
+    checksum = await reader.readline()
+    return TELEGRAM_START + body + checksum
+
+
+def parse_p1_source(source):
+    """Return the serial port, or the host and port of a P1-to-TCP bridge.
+
+    The port is None for a serial port. Raises ValueError when the source is
+    neither a serial port (/dev/...) nor host:port.
+    """
+    if source.startswith("/dev/"):
+        return source, None
+    host, _, port = source.rpartition(":")
+    if not host or not port.isdigit() or not 0 < int(port) < 65536:
+        raise ValueError(f"{source} is not a serial port (/dev/...) or host:port")
+    return host, int(port)
+
+
+async def async_open_p1(source):
+    """Open the stream of a serial port (/dev/...) or a host:port bridge."""
+    host, port = parse_p1_source(source)
+    if port is None:
+        # pyserial-asyncio is only imported when a meter is connected to the
+        # Home Assistant host itself.
+        import serial_asyncio  # pylint: disable=import-outside-toplevel
+
+        return await serial_asyncio.open_serial_connection(
+            url=source, baudrate=P1_BAUDRATE
+        )
+    return await asyncio.open_connection(host, port)
+
+
+class P1Listener:
+    """Hand every telegram received from a P1 port over to the sink.
+
+    The connection is kept open and restored when it drops. A telegram with
+    a wrong CRC is skipped, the next one follows within seconds.
+    """
+
+    def __init__(self, hass, source, sink):
+        """Initialize the listener."""
+        self.hass = hass
+        self.source = source
+        self._sink = sink
+        self._task = None
+        self._unsub_stop = None
+        self.telegrams = 0
+        self.crc_errors = 0
+
+    async def async_start(self):
+        """Start reading telegrams in the background until Home Assistant stops."""
+        self._task = self.hass.async_create_task(self._async_run())
+        self._unsub_stop = self.hass.bus.async_listen_once(
+            EVENT_HOMEASSISTANT_STOP, self._async_handle_stop
+        )
+
+    @callback
+    def _async_handle_stop(self, event):
+        """Stop reading telegrams when Home Assistant stops."""
+        self._unsub_stop = None
+        self.async_stop()
+
+    @callback
+    def async_stop(self):
+        """Stop reading telegrams."""
+        if self._unsub_stop is not None:
+            self._unsub_stop()
+            self._unsub_stop = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _async_run(self):
+        """Read telegrams until stopped, reconnect when the connection drops."""
+        # A source that cannot be parsed does not get better by retrying.
+        try:
+            parse_p1_source(self.source)
+        except ValueError as err:
+            _LOGGER.error("Invalid P1 port: %s", err)
+            return
+        while True:
+            try:
+                reader, writer = await async_open_p1(self.source)
+            except (OSError, ImportError) as err:
+                _LOGGER.error("Error connecting to P1 port %s: %s", self.source, err)
+                await asyncio.sleep(P1_RECONNECT_DELAY)
+                continue
+
+            try:
+                await self._async_read(reader)
+            except (
+                OSError,
+                asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError,
+                asyncio.TimeoutError,
+            ) as err:
+                _LOGGER.warning("Connection to P1 port %s lost: %s", self.source, err)
+            finally:
+                writer.close()
+            await asyncio.sleep(P1_RECONNECT_DELAY)
+
+    async def _async_read(self, reader):
+        """Parse the telegrams of an open connection."""
+        while True:
+            telegram = await asyncio.wait_for(
+                async_read_telegram(reader), P1_READ_TIMEOUT
+            )
+            try:
+                readings = parse_telegram(telegram)
+            except TelegramError as err:
+                self.crc_errors += 1
+                _LOGGER.debug("Skipping telegram from %s: %s", self.source, err)
+                continue
+            self.telegrams += 1
+            self._sink(readings)
@@ -0,0 +1,125 @@
+"""Readings pushed by the DSMR logger over MQTT."""
+import json
+import logging
+
+import voluptuous as vol
+
+from homeassistant.core import callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.event import async_call_later
+
+from .api import LIVE_FIELDS
+from .const import PUSH_COALESCE_DELAY
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def parse_value(value):
+    """Return a reading as a number if it is one."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def parse_mqtt_message(topic, payload):
+    """Extract the readings from a message published by the DSMR logger.
+
+    Depending on the firmware the DSMR logger publishes every reading to its
+    own <topic>/<name> topic, with the plain value or a {"<name>": value}
+    object as payload, or the complete actual response in one message.
+    """
+    try:
+        message = json.loads(payload)
+    except ValueError:
+        message = payload
+
+    if not isinstance(message, dict):
+        name = topic.rsplit("/", 1)[-1]
+        if name in LIVE_FIELDS:
+            return {name: parse_value(message)}
+        return {}
+
+    if isinstance(message.get("actual"), list):
+        return {
+            received["name"]: received.get("value", 0)
+            for received in message["actual"]
+            if received.get("name") in LIVE_FIELDS
+        }
+
+    readings = {}
+    for name, value in message.items():
+        if name not in LIVE_FIELDS:
+            continue
+        # Older firmware wraps the value like the restAPI does.
+        if isinstance(value, list) and value and isinstance(value[0], dict):
+            value = value[0].get("value", 0)
+        readings[name] = parse_value(value)
+    return readings
+
+
+class DSMRPushListener:
+    """Subscribe to the readings a DSMR logger publishes and hand them over.
+
+    The readings arriving within the coalesce delay are collected and handed
+    to the sink in one go, so a telegram published as a dozen messages
+    results in one update of the sensors.
+    """
+
+    def __init__(self, hass, topic, sink, delay=PUSH_COALESCE_DELAY):
+        """Initialize the listener."""
+        self.hass = hass
+        self.topic = topic.rstrip("/")
+        self._sink = sink
+        self._delay = delay
+        self._pending = {}
+        self._unsub_flush = None
+        self._unsub_mqtt = None
+
+    async def async_start(self):
+        """Subscribe to the topic of the DSMR logger."""
+        # MQTT is optional, it is only loaded when a logger pushes.
+        from homeassistant.components import (  # pylint: disable=import-outside-toplevel
+            mqtt,
+        )
+
+        if "mqtt" not in self.hass.config.components:
+            _LOGGER.error("MQTT is not set up, %s is not received", self.topic)
+            return
+        try:
+            self._unsub_mqtt = await mqtt.async_subscribe(
+                self.hass, f"{self.topic}/#", self._async_message_received
+            )
+        except (HomeAssistantError, vol.Invalid) as err:
+            _LOGGER.error("Error subscribing to %s: %s", self.topic, err)
+
+    @callback
+    def async_stop(self):
+        """Unsubscribe and drop the readings not handed over yet."""
+        if self._unsub_mqtt is not None:
+            self._unsub_mqtt()
+            self._unsub_mqtt = None
+        if self._unsub_flush is not None:
+            self._unsub_flush()
+            self._unsub_flush = None
+        self._pending = {}
+
+    @callback
+    def _async_message_received(self, msg):
+        """Collect the readings of a message."""
+        readings = parse_mqtt_message(msg.topic, msg.payload)
+        if not readings:
+            _LOGGER.debug("No readings in message on %s", msg.topic)
+            return
+        self._pending.update(readings)
+        if self._unsub_flush is None:
+            self._unsub_flush = async_call_later(
+                self.hass, self._delay, self._async_flush
+            )
+
+    @callback
+    def _async_flush(self, _now):
+        """Hand the collected readings to the sink."""
+        self._unsub_flush = None
+        readings, self._pending = self._pending, {}
+        self._sink(readings)
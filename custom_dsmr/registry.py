@@ -0,0 +1,135 @@
+"""Descriptions of the sensors of the custom dsmr integration."""
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+# The period of a sensor is the restAPI its value is read from. Derived
+# sensors are calculated from the actual readings.
+HISTORY_PERIODS = ("hours", "days", "months")
+PERIODS = ("actual", "derived") + HISTORY_PERIODS
+UTILITIES = ("energy", "gas")
+
+
+class SensorDescription:
+    """Unit, icon, utility, period and name of a sensor.
+
+    The name defaults to the key. The optional deadband is the minimal change
+    of the value before a new state is written, by default every change is
+    written.
+    """
+
+    __slots__ = ("key", "unit", "icon", "utility", "period", "name", "deadband")
+
+    def __init__(
+        self,
+        key: str,
+        unit: str,
+        icon: str,
+        utility: str,
+        period: str,
+        name: Optional[str] = None,
+        deadband: float = 0,
+    ):
+        """Initialize the description."""
+        self.key = key
+        self.name = name or key.replace("_", " ")
+        self.unit = unit
+        self.icon = icon
+        self.utility = utility
+        self.period = period
+        self.deadband = deadband
+
+    def __repr__(self):
+        """Return the description for debugging."""
+        return f"<SensorDescription {self.key} {self.period}>"
+
+
+class SensorRegistry:
+    """All sensor descriptions, indexed by key, period and utility.
+
+    The descriptions are checked when the registry is created, so an
+    inconsistent table fails at import time instead of creating sensors
+    that are never updated.
+    """
+
+    __slots__ = ("_by_key", "_by_period", "_by_utility")
+
+    def __init__(self, descriptions: Iterable[SensorDescription]):
+        """Index and check the descriptions."""
+        self._by_key: Dict[str, SensorDescription] = {}
+        by_period = {period: [] for period in PERIODS}
+        by_utility = {utility: [] for utility in UTILITIES}
+        for description in descriptions:
+            self._check(description)
+            self._by_key[description.key] = description
+            by_period[description.period].append(description)
+            by_utility[description.utility].append(description)
+        self._by_period = {key: tuple(value) for key, value in by_period.items()}
+        self._by_utility = {key: tuple(value) for key, value in by_utility.items()}
+        self._check_series()
+
+    def _check(self, description: SensorDescription):
+        """Raise ValueError if a description does not fit the others."""
+        if description.key in self._by_key:
+            raise ValueError(f"Sensor {description.key} is described twice")
+        if description.period not in PERIODS:
+            raise ValueError(
+                f"Sensor {description.key} has unknown period {description.period!r}"
+            )
+        if description.utility not in UTILITIES:
+            raise ValueError(
+                f"Sensor {description.key} has unknown utility {description.utility!r}"
+            )
+        # History sensors are named <utility>_<period>_<direction>_<index>.
+        parts = description.key.split("_")
+        if description.period in HISTORY_PERIODS and (
+            len(parts) != 4 or parts[:2] != [description.utility, description.period]
+        ):
+            raise ValueError(
+                f"Sensor {description.key} does not match period {description.period}"
+            )
+
+    def _check_series(self):
+        """Raise ValueError if the sensors of a history series differ in unit."""
+        units = {}
+        for period in HISTORY_PERIODS:
+            for description in self._by_period[period]:
+                series = description.key.rsplit("_", 1)[0].replace(f"_{period}", "")
+                unit = units.setdefault(series, description.unit)
+                if unit != description.unit:
+                    raise ValueError(
+                        f"Sensor {description.key} has unit {description.unit}, "
+                        f"the other {series} sensors have {unit}"
+                    )
+
+    def __contains__(self, key) -> bool:
+        """Return True if the sensor is described."""
+        return key in self._by_key
+
+    def __getitem__(self, key: str) -> SensorDescription:
+        """Return the description of a sensor."""
+        return self._by_key[key]
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the keys of all sensors."""
+        return iter(self._by_key)
+
+    def __len__(self) -> int:
+        """Return the number of sensors."""
+        return len(self._by_key)
+
+    def get(self, key: str) -> Optional[SensorDescription]:
+        """Return the description of a sensor, None if it is unknown."""
+        return self._by_key.get(key)
+
+    def for_period(self, period: str) -> Tuple[SensorDescription, ...]:
+        """Return the sensors read from a period."""
+        return self._by_period.get(period, ())
+
+    def for_periods(self, periods: Iterable[str]) -> Tuple[SensorDescription, ...]:
+        """Return the sensors read from any of the periods."""
+        return tuple(
+            description for period in periods for description in self.for_period(period)
+        )
+
+    def for_utility(self, utility: str) -> Tuple[SensorDescription, ...]:
+        """Return the sensors of a utility."""
+        return self._by_utility.get(utility, ())
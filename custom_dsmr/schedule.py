@@ -0,0 +1,90 @@
+"""Schedule of the history requests of the DSMR loggers."""
+from datetime import timedelta
+import random
+
+from homeassistant.util import dt as dt_util
+
+from .const import HISTORY_RETRY, HISTORY_ROLLOVER_DELAY, HISTORY_SPREAD
+from .store import as_local, from_recid
+
+
+def next_rollover(period, now):
+    """Return the (local) start of the period that follows the one of now."""
+    # The start is calculated in naive local time and localized after, the
+    # offset of now does not apply after a daylight saving time change.
+    start = dt_util.as_local(now).replace(
+        minute=0, second=0, microsecond=0, tzinfo=None
+    )
+    if period == "hours":
+        return as_local(start + timedelta(hours=1))
+    start = start.replace(hour=0)
+    if period == "days":
+        return as_local(start + timedelta(days=1))
+    if start.month == 12:
+        return as_local(start.replace(year=start.year + 1, month=1, day=1))
+    return as_local(start.replace(month=start.month + 1, day=1))
+
+
+class HistorySchedule:
+    """Tell when the history of one period of a DSMR logger is due.
+
+    A history record only becomes final when the DSMR logger rolls over to
+    the next period, so the history is requested once just after every
+    rollover: hourly for hours, after midnight for days and on the first of
+    the month for months. The rollover follows from the newest recid of the
+    last response, in between the cached records are served.
+
+    Every logger and period gets its own offset after the rollover, so a
+    fleet of loggers is not requested at the same moment. The offset is
+    derived from the host, it stays the same after a restart. The first
+    request after a start waits for the offset as well.
+    """
+
+    def __init__(self, host, period, now=None):
+        """Initialize the schedule, the first request is due after the offset."""
+        self.period = period
+        self._random = random.Random(f"{host} {period}")
+        self.offset = timedelta(
+            seconds=HISTORY_ROLLOVER_DELAY + self._random.uniform(0, HISTORY_SPREAD)
+        )
+        self.next_update = (now or dt_util.utcnow()) + self.offset
+        self.rollover = None
+
+    def due(self, now):
+        """Return True if the history should be requested."""
+        return self.next_update is None or now >= self.next_update
+
+    def current(self, now):
+        """Return True if the newest record is still the running period."""
+        return self.rollover is not None and now < self.rollover
+
+    def force(self):
+        """Request the history with the next update."""
+        self.next_update = None
+
+    def record(self, now, success, head_recid=None):
+        """Plan the next request after a request at now."""
+        if not success:
+            self._retry(now)
+            return
+        # The newest record is the running period, nothing but that record
+        # changes until the period after it starts.
+        start = from_recid(head_recid) if head_recid is not None else now
+        self.rollover = dt_util.as_utc(next_rollover(self.period, start))
+        self.next_update = self.rollover + self.offset
+        if self.next_update <= now:
+            # The DSMR logger did not roll over yet, its clock runs behind.
+            self._retry(now)
+
+    def _retry(self, now):
+        """Plan the next request within a few minutes."""
+        retry = HISTORY_RETRY * self._random.uniform(1, 1.5)
+        self.next_update = now + timedelta(seconds=retry)
+
+    def as_dict(self):
+        """Return the schedule for diagnostics."""
+        return {
+            "offset": self.offset.total_seconds(),
+            "next_update": self.next_update.isoformat() if self.next_update else None,
+            "rollover": self.rollover.isoformat() if self.rollover else None,
+        }
@@ -1,239 +1,168 @@
 """Sensor for the custom dsmr api logger."""
-import asyncio
 import logging
-from datetime import timedelta
+from urllib.parse import urlparse
 
-import async_timeout
-from aiohttp import ClientError
+from homeassistant.const import STATE_UNAVAILABLE, STATE_UNKNOWN, TIME_MILLISECONDS
+from homeassistant.core import callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.restore_state import RestoreEntity
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+from homeassistant.util import dt as dt_util
 
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
-from homeassistant.helpers.entity import Entity
-from homeassistant.util import Throttle
-
-from .const import (
-    API_V1_ACTUAL,
-    API_V1_HIST_DAYS,
-    API_V1_HIST_HOURS,
-    API_V1_HIST_MONTHS,
-    DOMAIN,
-    SENSOR_FORMAT,
-)
+from .const import ATTR_HISTORY, ATTR_LAST_FETCHED, DOMAIN, SENSOR_FORMAT
 
 _LOGGER = logging.getLogger(__name__)
 
-MIN_TIME_BETWEEN_LIVE_UPDATES = timedelta(seconds=60)
-MIN_TIME_BETWEEN_LONG_UPDATES = timedelta(hours=1)
+# The sensors created once their reading shows up in the live data.
+LIVE_PERIODS = ("actual", "derived")
 
 
 async def async_setup_entry(hass, config_entry, async_add_devices):
     """Set up the DSMR sensors."""
-    session = async_get_clientsession(hass)
-    config = hass.data[DOMAIN][config_entry.entry_id]
-    host_api_actual = config["host"] + API_V1_ACTUAL
-    host_api_hist_hours = config["host"] + API_V1_HIST_HOURS
-    host_api_hist_days = config["host"] + API_V1_HIST_DAYS
-    host_api_hist_months = config["host"] + API_V1_HIST_MONTHS
-
-    sensor_entities = []
+    coordinators = hass.data[DOMAIN][config_entry.entry_id]
 
     # The DSMR logger exposes multiple restAPI's for the data we collect.
-    # The current and historical measurements are requested at different
-    # intervals to limit the total number of requests.
+    # The coordinator requests the current and historical measurements at
+    # different intervals to limit the total number of requests, the
+    # sensors only subscribe to the periods the coordinator polls.
     #
-    # Creation of the current measurement sensors.
-    # Add the sensors exposed by the dsmr client.
-    live_data = DSMRLiveData(session, host_api_actual)
-    for key in SENSOR_FORMAT:
-        if SENSOR_FORMAT[key].get("period") == "actual":
-            sensor_entities.append(DSMRSensor(key, live_data))
-
-    # Creation of the optional historical sensors.
-    if config["history_hour"]:
-        hist_data = DSMRHistData(session, host_api_hist_hours, "hours")
-        for key in SENSOR_FORMAT:
-            if SENSOR_FORMAT[key].get("period") == "hours":
-                sensor_entities.append(DSMRSensor(key, hist_data))
-
-    if config["history_day"]:
-        hist_data = DSMRHistData(session, host_api_hist_days, "days")
-        for key in SENSOR_FORMAT:
-            if SENSOR_FORMAT[key].get("period") == "days":
-                sensor_entities.append(DSMRSensor(key, hist_data))
-
-    if config["history_month"]:
-        hist_data = DSMRHistData(session, host_api_hist_months, "months")
-        for key in SENSOR_FORMAT:
-            if SENSOR_FORMAT[key].get("period") == "months":
-                sensor_entities.append(DSMRSensor(key, hist_data))
-
-    async_add_devices(sensor_entities, True)
-
-
-class DSMRLiveData:
-    """Representation of a DSMR sensor with live usage data."""
-
-    def __init__(self, session, host_api_actual):
-        """Initialize the live data object."""
-        self._data = None
-        self._session = session
-        self._api = host_api_actual
-
-    @property
-    def data(self):
-        """Return the data."""
-        return self._data
-
-    @property
-    def api(self):
-        """Return the api."""
-        return self._api
-
-    def latest_data(self, sensor):
-        """Return the latest available data."""
-        if self._data is None:
-            return None
-        return self._data.get(sensor).get("value", 0)
-
-    def parse_live_data(self, json_data):
-        """Extract the live measurements from the DSMR response."""
-        # The json_data contains all values for the actual power and
-        # energy and gas (running total) meter readings.
-        #
-        # All values are stored in a dictionary using the meter reading
-        # as the key.
-        # E.G.: data["energy_delivered_tariff1"] = 1500
-        if json_data is not None:
-            formatted = {}
-            try:
-                for received in json_data["actual"]:
-                    formatted[received.pop("name")] = received
-                self._data = formatted
-            except KeyError as err:
-                _LOGGER.debug("Failed to read the JSON message using key %s", err)
-                self._data = None
-
-    @Throttle(MIN_TIME_BETWEEN_LIVE_UPDATES)
-    async def async_update(self):
-        """Request the live measurements from the DSMR logger."""
-        try:
-            with async_timeout.timeout(10):
-                response = await self._session.get(self.api)
-                json_data = await response.json()
-        except (asyncio.TimeoutError):
-            _LOGGER.error("Timeout connecting to the DSMR meter")
-            self._data = None
-        except (ClientError) as err:
-            _LOGGER.error("Error retrieving DSMR data: %s", repr(err))
-            self._data = None
-
-        return self.parse_live_data(json_data)
-
-
-class DSMRHistData:
-    """Manages the data retreived from the DSMR end device."""
-
-    def __init__(self, session, host_api, period):
-        """Initialize the data object."""
-        self._data = None
-        self._session = session
-        self._api = host_api
-        self._period = period
-
-    @property
-    def data(self):
-        """Return the data."""
-        return self._data
-
-    @property
-    def api(self):
-        """Return the api."""
-        return self._api
-
-    def latest_data(self, sensor):
-        """Return the latest historical data."""
-        if self._data is None:
-            return None
-        return self._data.get(sensor)
-
-    def parse_historical_data(self, json_data):
-        """Extract the historical statistics from the DSMR response."""
-        # The historical data contains the delivered energy, delivered gas and
-        # returned energy values for the requested time period.
-        # All values are represented by a peak and offpeak value.
-        #
-        # All values are stored as a running total of all previous periods.
-        # We take the current value subtracted by the previous value to
-        # get the current energy or gass usage.
-        if json_data is not None:
-            formatted = {}
-            try:
-                for i in range(2):
-                    cur_del = (
-                        json_data[self._period][i]["edt1"]
-                        + json_data[self._period][i]["edt2"]
-                    )
-                    prev_del = (
-                        json_data[self._period][i + 1]["edt1"]
-                        + json_data[self._period][i + 1]["edt2"]
-                    )
-                    formatted[("energy_" + self._period + "_delivered_" + str(i))] = (
-                        cur_del - prev_del
-                    )
-                    cur_ret = (
-                        json_data[self._period][i]["ert1"]
-                        + json_data[self._period][i]["ert2"]
-                    )
-                    prev_ret = (
-                        json_data[self._period][i + 1]["ert1"]
-                        + json_data[self._period][i + 1]["ert2"]
-                    )
-                    formatted[("energy_" + self._period + "_returned_" + str(i))] = (
-                        cur_ret - prev_ret
-                    )
-                    cur_gas = json_data[self._period][i]["gdt"]
-                    prev_gas = json_data[self._period][i + 1]["gdt"]
-                    formatted[("gas_" + self._period + "_delivered_" + str(i))] = (
-                        cur_gas - prev_gas
-                    )
-                self._data = formatted
-            except KeyError as err:
-                _LOGGER.debug("Failed to read the JSON message using key %s", err)
-                self._data = None
-
-    @Throttle(MIN_TIME_BETWEEN_LONG_UPDATES)
-    async def async_update(self):
-        """Request the historical statistics from the DSMR logger."""
-        try:
-            with async_timeout.timeout(10):
-                response = await self._session.get(self.api)
-                json_data = await response.json()
-        except (asyncio.TimeoutError):
-            _LOGGER.error("Timeout connecting to the DSMR meter")
-            self._data = None
-        except (ClientError) as err:
-            _LOGGER.error("Error retrieving DSMR data: %s", repr(err))
-            self._data = None
-
-        return self.parse_historical_data(json_data)
-
-
-class DSMRSensor(Entity):
+    # With more than one DSMR logger in the entry the sensor names are
+    # prefixed with the logger they belong to.
+    #
+    # The first request runs in the background, the live sensors created
+    # before are added again right away so they restore their last state.
+    registry = await er.async_get_registry(hass)
+    registered = [
+        entry.unique_id
+        for entry in er.async_entries_for_config_entry(registry, config_entry.entry_id)
+    ]
+    sensor_entities = []
+    for host, coordinator in coordinators.items():
+        prefix = urlparse(host).netloc if len(coordinators) > 1 else None
+        sensor_entities.extend(
+            DSMRSensor(coordinator, description.key, prefix)
+            for description in SENSOR_FORMAT.for_periods(coordinator.hist_data)
+        )
+        sensor_entities.extend(
+            DSMRDiagnosticSensor(coordinator, endpoint, prefix)
+            for endpoint in coordinator.endpoints
+        )
+        coordinator.unsub_listeners.append(
+            coordinator.async_add_listener(
+                LiveSensorFactory(
+                    coordinator,
+                    prefix,
+                    async_add_devices,
+                    [
+                        unique_id[len(host) + 1 :]
+                        for unique_id in registered
+                        if unique_id.startswith(f"{host}_")
+                    ],
+                )
+            )
+        )
+
+    async_add_devices(sensor_entities)
+
+
+class LiveSensorFactory:
+    """Add the live sensors of a DSMR logger once it reports their reading.
+
+    Meters differ in the readings they report, single phase meters have no
+    L2 and L3 readings. A live sensor is only created when its reading shows
+    up in the data of the coordinator, the factory is called after every
+    update of the coordinator. The sensors in the entity registry were
+    reported before and are created right away.
+    """
+
+    def __init__(self, coordinator, prefix, async_add_devices, registered=()):
+        """Initialize the factory and add the known sensors."""
+        self._coordinator = coordinator
+        self._prefix = prefix
+        self._async_add_devices = async_add_devices
+        self._added = set()
+        self._snapshot = None
+        self._add_sensors(registered)
+        self()
+
+    @callback
+    def __call__(self):
+        """Add the sensors of the readings that are new in the data."""
+        data = self._coordinator.data
+        if not data or data is self._snapshot:
+            return
+        self._snapshot = data
+        self._add_sensors(data)
+
+    def _add_sensors(self, keys):
+        """Add the live sensors of the keys that have no sensor yet."""
+        new_sensors = [
+            DSMRSensor(self._coordinator, description.key, self._prefix)
+            for description in SENSOR_FORMAT.for_periods(LIVE_PERIODS)
+            if description.key in keys and description.key not in self._added
+        ]
+        if new_sensors:
+            self._added.update(sensor.sensor for sensor in new_sensors)
+            self._async_add_devices(new_sensors)
+
+
+class DSMRSensor(CoordinatorEntity, RestoreEntity):
     """Manages the individual sensors representing the measurements of the DSMR device."""
 
-    def __init__(self, sensor, data):
+    def __init__(self, coordinator, sensor, prefix=None):
         """Initialize the sensor."""
+        super().__init__(coordinator)
+        description = SENSOR_FORMAT[sensor]
         self._sensor = sensor
-        self._data = data
-        self._name = SENSOR_FORMAT[sensor].get("name")
-        self._icon = SENSOR_FORMAT[sensor].get("icon")
-        self._unit_of_measurement = SENSOR_FORMAT[sensor].get("unit")
+        self._name = description.name
+        if prefix:
+            self._name = f"{prefix} {self._name}"
+        self._icon = description.icon
+        self._unit_of_measurement = description.unit
+        self._deadband = description.deadband
+        self._period = description.period
+        # The *_1 history sensors carry the usage of the full ring buffer.
+        # They only change at a rollover, the running period (*_0) follows
+        # the live readings and would write the whole buffer on every poll.
+        self._series = sensor[:-2] if sensor.endswith("_1") else None
         self._state = None
+        self._snapshot = None
+        self._was_available = None
+        self._update_state()
+
+    async def async_added_to_hass(self):
+        """Restore the last state until the DSMR logger answered."""
+        await super().async_added_to_hass()
+        if self._state is not None:
+            return
+        last_state = await self.async_get_last_state()
+        if last_state is None or last_state.state in (STATE_UNAVAILABLE, STATE_UNKNOWN):
+            return
+        try:
+            self._state = float(last_state.state)
+        except ValueError:
+            self._state = last_state.state
+        # The monthly peak continues from the restored state.
+        if self._period == "derived":
+            self.coordinator.derived.restore(
+                self._sensor, self._state, last_state.last_updated, dt_util.utcnow()
+            )
+
+    @property
+    def sensor(self):
+        """Return the key of the reading of this sensor."""
+        return self._sensor
 
     @property
     def name(self):
         """Return the name of the sensor."""
         return self._name
 
+    @property
+    def unique_id(self):
+        """Return the unique id of the sensor."""
+        return f"{self.coordinator.host}_{self._sensor}"
+
     @property
     def state(self):
         """Return the current state of the sensor."""
@@ -249,12 +178,112 @@ class DSMRSensor(Entity):
         """Return the unit of measurement of the sensor."""
         return self._unit_of_measurement
 
-    async def async_update(self):
-        """Update the sensor with the latest received data."""
-        await self._data.async_update()
-        new_data = self._data.latest_data(self._sensor)
+    @property
+    def device_state_attributes(self):
+        """Return when the data was received and the usage of the ring buffer."""
+        # The moment the data was received only changes with new data, an age
+        # would change on every write and add a row of attributes each time.
+        attributes = {}
+        fetched = self.coordinator.fetched(self._period)
+        if fetched is not None:
+            attributes[ATTR_LAST_FETCHED] = fetched.isoformat()
+        hist_data = self.coordinator.hist_data.get(self._period)
+        if hist_data is not None and self._series in hist_data.usage:
+            attributes[ATTR_HISTORY] = dict(
+                zip(hist_data.history.recids, hist_data.usage[self._series])
+            )
+        return attributes or None
+
+    def _update_state(self):
+        """Take the latest value of this sensor from the coordinator snapshot."""
+        self._snapshot = self.coordinator.data
+        if not self.coordinator.data:
+            return
+        new_data = self.coordinator.data.get(self._sensor)
         if new_data is not None:
             self._state = new_data
             _LOGGER.debug(
                 "Updated sensor %s: new state =  %s", self._sensor, self._state
-            )
\ No newline at end of file
+            )
+
+    def _state_changed(self):
+        """Return True if the snapshot value moved outside the deadband."""
+        if not self.coordinator.data:
+            return False
+        new_data = self.coordinator.data.get(self._sensor)
+        if new_data is None:
+            return False
+        if self._state is None:
+            return True
+        try:
+            return abs(new_data - self._state) > self._deadband
+        except TypeError:
+            return new_data != self._state
+
+    @callback
+    def _handle_coordinator_update(self):
+        """Handle the snapshot pushed by the coordinator."""
+        # The coordinator hands out the same snapshot object when the DSMR
+        # logger returned identical values, there is nothing to write then.
+        available = self.available
+        if self.coordinator.data is self._snapshot and available == self._was_available:
+            return
+        if available == self._was_available and not self._state_changed():
+            self._snapshot = self.coordinator.data
+            return
+        self._was_available = available
+        self._update_state()
+        self.async_write_ha_state()
+
+
+class DSMRDiagnosticSensor(CoordinatorEntity):
+    """Request statistics of one endpoint of the DSMR logger."""
+
+    def __init__(self, coordinator, endpoint, prefix=None):
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+        self._stats = coordinator.endpoints[endpoint].stats
+        self._name = f"poll latency {endpoint.rsplit('/', 1)[-1]}"
+        if prefix:
+            self._name = f"{prefix} {self._name}"
+        self._unique_id = f"{coordinator.host}{endpoint}_latency"
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return self._name
+
+    @property
+    def unique_id(self):
+        """Return the unique id of the sensor."""
+        return self._unique_id
+
+    @property
+    def entity_registry_enabled_default(self):
+        """Return False, the statistics are only of interest when debugging."""
+        return False
+
+    @property
+    def available(self):
+        """Return True, the statistics are also kept while requests fail."""
+        return True
+
+    @property
+    def state(self):
+        """Return the median request latency."""
+        return self._stats.as_dict()["latency_p50"]
+
+    @property
+    def icon(self):
+        """Return the sensor icon for the frontend ."""
+        return "mdi:timer-outline"
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit of measurement of the sensor."""
+        return TIME_MILLISECONDS
+
+    @property
+    def device_state_attributes(self):
+        """Return the other request statistics."""
+        return self._stats.as_dict()
@@ -0,0 +1,83 @@
+"""Request statistics of the DSMR logger endpoints."""
+from collections import deque
+
+# Number of request latencies kept to calculate the percentiles.
+STATS_SAMPLES = 100
+
+
+def _milliseconds(seconds):
+    """Return a duration in seconds as rounded milliseconds."""
+    if seconds is None:
+        return None
+    return round(seconds * 1000, 1)
+
+
+class EndpointStats:
+    """Latency, size and error counts of the requests to one endpoint."""
+
+    def __init__(self, samples=STATS_SAMPLES):
+        """Initialize the statistics."""
+        self.latencies = deque(maxlen=samples)
+        self.requests = 0
+        self.timeouts = 0
+        self.client_errors = 0
+        self.parse_errors = 0
+        self.payload_size = None
+        self.parse_time = None
+
+    def record_request(self, latency, payload_size, parse_time):
+        """Record a successful request."""
+        self.requests += 1
+        self.latencies.append(latency)
+        self.payload_size = payload_size
+        self.parse_time = parse_time
+
+    def record_timeout(self):
+        """Record a request that timed out."""
+        self.requests += 1
+        self.timeouts += 1
+
+    def record_client_error(self):
+        """Record a request that failed with a client error."""
+        self.requests += 1
+        self.client_errors += 1
+
+    def record_parse_error(self):
+        """Record a response that could not be parsed."""
+        self.requests += 1
+        self.parse_errors += 1
+
+    @property
+    def errors(self):
+        """Return the number of failed requests."""
+        return self.timeouts + self.client_errors + self.parse_errors
+
+    @property
+    def error_rate(self):
+        """Return the fraction of failed requests."""
+        if not self.requests:
+            return None
+        return self.errors / self.requests
+
+    def percentile(self, percent):
+        """Return the latency percentile (nearest rank) in seconds."""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        rank = max(0, -(-len(ordered) * percent // 100) - 1)
+        return ordered[int(rank)]
+
+    def as_dict(self):
+        """Return the statistics with all durations in milliseconds."""
+        return {
+            "requests": self.requests,
+            "timeouts": self.timeouts,
+            "client_errors": self.client_errors,
+            "parse_errors": self.parse_errors,
+            "error_rate": self.error_rate,
+            "latency_p50": _milliseconds(self.percentile(50)),
+            "latency_p90": _milliseconds(self.percentile(90)),
+            "latency_p99": _milliseconds(self.percentile(99)),
+            "payload_size": self.payload_size,
+            "parse_time": _milliseconds(self.parse_time),
+        }
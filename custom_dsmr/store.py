@@ -0,0 +1,229 @@
+"""Local store of the history records evicted from the DSMR logger ring buffer."""
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+import mmap
+import os
+import struct
+
+from homeassistant.helpers.storage import STORAGE_DIR
+from homeassistant.util import dt as dt_util, slugify
+
+from .const import DOMAIN
+from .history import HISTORY_FIELDS, HISTORY_SERIES
+
+# Every record is stored as its recid (YYMMDDHH) followed by the running
+# totals of the history fields. The records have a fixed width and are
+# appended oldest first, so record n is found at n * RECORD.size and the
+# recids are sorted: the file is its own time index.
+RECORD = struct.Struct("<I" + "d" * len(HISTORY_FIELDS))
+# Position of every field in an unpacked record, after the recid.
+_FIELD_INDEX = {field: index for index, field in enumerate(HISTORY_FIELDS, 1)}
+
+
+def store_path(hass, host, period):
+    """Return the path of the local store of a history period of a DSMR logger."""
+    # The stores are kept with the other state of Home Assistant, they are
+    # removed together with the config entry of the DSMR logger.
+    return hass.config.path(STORAGE_DIR, f"{DOMAIN}.{slugify(host)}_{period}.bin")
+
+
+def as_local(moment):
+    """Return a moment in the local time zone, a naive moment is local time."""
+    # The time zone is a pytz time zone, it has to localize a naive moment
+    # to get the offset that applies at that moment.
+    if moment.tzinfo is None:
+        return dt_util.DEFAULT_TIME_ZONE.localize(moment)
+    return dt_util.as_local(moment)
+
+
+def to_recid(moment):
+    """Return the recid of the history record a (local) moment falls in."""
+    return int(moment.strftime("%y%m%d%H"))
+
+
+def recid_range(start, end, period):
+    """Return the first and last recid of the records from start up to end.
+
+    The records the (local) moments fall in are included. The recid of a day
+    or month record holds the hour it was last updated, the range covers
+    every hour of the first and the last period.
+    """
+    first, last = to_recid(start), to_recid(end)
+    if period == "days":
+        return first // 100 * 100, last // 100 * 100 + 23
+    if period == "months":
+        return first // 10000 * 10000, last // 10000 * 10000 + 3123
+    return first, last
+
+
+def from_recid(recid):
+    """Return the (local) start of the history record with the recid."""
+    recid = int(recid)
+    return as_local(
+        datetime(
+            2000 + recid // 1000000,
+            recid // 10000 % 100,
+            recid // 100 % 100,
+            recid % 100,
+        )
+    )
+
+
+class _RecidView:
+    """The recids of a mapped store file as a sequence, for bisect."""
+
+    __slots__ = ("buffer",)
+
+    def __init__(self, buffer):
+        """Initialize the view."""
+        self.buffer = buffer
+
+    def __len__(self):
+        """Return the number of records."""
+        return len(self.buffer) // RECORD.size
+
+    def __getitem__(self, index):
+        """Return the recid of a record."""
+        return RECORD.unpack_from(self.buffer, index * RECORD.size)[0]
+
+
+class HistoryStore:
+    """Append-only file with the final records of one history period.
+
+    The newest record of the DSMR logger is the running period and still
+    changes, only the records before it are final and stored. All methods do
+    blocking file I/O and run in the executor.
+    """
+
+    def __init__(self, path):
+        """Initialize the store, the file is created with the first record."""
+        self.path = path
+        self._last_recid = None
+        self._loaded = False
+
+    def _load(self):
+        """Read the recid of the last stored record."""
+        self._loaded = True
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return
+        # A record that was cut off while it was written is dropped.
+        if size % RECORD.size:
+            size -= size % RECORD.size
+            os.truncate(self.path, size)
+        if size:
+            with open(self.path, "rb") as store_file:
+                store_file.seek(size - RECORD.size)
+                self._last_recid = RECORD.unpack(store_file.read(RECORD.size))[0]
+
+    def remove(self):
+        """Delete the file of the store with all its records."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        self._last_recid = None
+        self._loaded = True
+
+    @property
+    def last_recid(self):
+        """Return the recid of the newest stored record."""
+        if not self._loaded:
+            self._load()
+        return self._last_recid
+
+    def append(self, history):
+        """Store the final records of the history columns not stored yet."""
+        last_recid = self.last_recid
+        packed = bytearray()
+        # The columns are newest first and the newest record is not final.
+        for index in range(len(history) - 1, 0, -1):
+            recid = int(history.recids[index])
+            if last_recid is not None and recid <= last_recid:
+                continue
+            packed += RECORD.pack(
+                recid, *(history.columns[field][index] for field in HISTORY_FIELDS)
+            )
+            last_recid = recid
+        if not packed:
+            return 0
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "ab") as store_file:
+            store_file.write(packed)
+        self._last_recid = last_recid
+        return len(packed) // RECORD.size
+
+    def query(self, start, end):
+        """Return the stored records with a recid from start up to end."""
+        records = []
+        with self._map() as buffer:
+            if buffer is None:
+                return records
+            recids = _RecidView(buffer)
+            for index in range(bisect_left(recids, start), bisect_right(recids, end)):
+                recid, *values = RECORD.unpack_from(buffer, index * RECORD.size)
+                records.append((recid, dict(zip(HISTORY_FIELDS, values))))
+        return records
+
+    def usage(self, start, end):
+        """Return the usage per series of the records from start up to end.
+
+        The series are named like the history series without the period,
+        E.G.: energy_delivered.
+        """
+        # A record holds the running totals at the end of its period, the
+        # usage is the difference with the record before the first one. The
+        # oldest stored record has nothing before it, its own usage is
+        # unknown.
+        with self._map() as buffer:
+            if buffer is None:
+                return None
+            recids = _RecidView(buffer)
+            first = bisect_left(recids, start)
+            last = bisect_right(recids, end) - 1
+            if last < first:
+                return None
+            base = RECORD.unpack_from(buffer, max(first - 1, 0) * RECORD.size)
+            head = RECORD.unpack_from(buffer, last * RECORD.size)
+        return {
+            series.replace("_{}", ""): sum(
+                head[_FIELD_INDEX[field]] - base[_FIELD_INDEX[field]]
+                for field in fields
+            )
+            for series, fields in HISTORY_SERIES.items()
+        }
+
+    def _map(self):
+        """Map the store file in memory, None while there is nothing stored."""
+        return _MappedFile(self.path)
+
+
+class _MappedFile:
+    """Context manager mapping a file read only, None if it is empty."""
+
+    def __init__(self, path):
+        """Initialize the mapping."""
+        self.path = path
+        self._file = None
+        self._map = None
+
+    def __enter__(self):
+        """Map the file."""
+        try:
+            self._file = open(self.path, "rb")
+        except FileNotFoundError:
+            return None
+        size = os.fstat(self._file.fileno()).st_size
+        size -= size % RECORD.size
+        if not size:
+            return None
+        self._map = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+        return self._map
+
+    def __exit__(self, *args):
+        """Unmap and close the file."""
+        if self._map is not None:
+            self._map.close()
+        if self._file is not None:
+            self._file.close()
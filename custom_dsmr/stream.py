@@ -0,0 +1,83 @@
+"""Incremental JSON parsing of the DSMR logger responses."""
+import codecs
+import json
+import time
+
+STREAM_CHUNK_SIZE = 512
+
+_DECODER = json.JSONDecoder()
+_SEPARATORS = " \t\n\r,"
+
+
+class ReadCounter:
+    """Number of bytes read and time spent decoding while streaming a body."""
+
+    __slots__ = ("size", "parse_time")
+
+    def __init__(self):
+        """Initialize the counters."""
+        self.size = 0
+        self.parse_time = 0.0
+
+
+async def async_iter_json_array(
+    content, key, chunk_size=STREAM_CHUNK_SIZE, counter=None
+):
+    """Yield the objects of the array stored under key as soon as they are read."""
+    # The DSMR logger answers with a single object holding one array, e.g.
+    # {"actual": [{"name": ..., "value": ...}, ...]}. Only the part of the
+    # body that has not been decoded yet is kept in memory, the caller can
+    # stop reading the body by breaking out of the loop.
+    if counter is None:
+        counter = ReadCounter()
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    chunks = content.iter_chunked(chunk_size)
+    buffer = ""
+    pos = None
+    eof = False
+
+    async def read_more():
+        nonlocal buffer, eof
+        try:
+            chunk = await chunks.__anext__()
+        except StopAsyncIteration:
+            eof = True
+            buffer += decoder.decode(b"", final=True)
+            return
+        counter.size += len(chunk)
+        buffer += decoder.decode(chunk)
+
+    # Find the start of the array.
+    marker = json.dumps(key)
+    while pos is None:
+        start = buffer.find(marker)
+        if start != -1:
+            bracket = buffer.find("[", start + len(marker))
+            if bracket != -1:
+                pos = bracket + 1
+                break
+        if eof:
+            raise ValueError(f"No array {key} in the response")
+        await read_more()
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in _SEPARATORS:
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        decode_start = time.perf_counter()
+        try:
+            item, end = _DECODER.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            counter.parse_time += time.perf_counter() - decode_start
+            # The object is not complete yet, read the next chunk.
+            if eof:
+                raise
+            buffer = buffer[pos:]
+            pos = 0
+            await read_more()
+            continue
+        counter.parse_time += time.perf_counter() - decode_start
+        yield item
+        buffer = buffer[end:]
+        pos = 0
@@ -0,0 +1,121 @@
+"""Local stand-in for the restAPI of one or more DSMR loggers."""
+import asyncio
+import random
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+HIST_PERIODS = ("hours", "days", "months")
+
+
+class FakeDSMRLogger:
+    """Serve the DSMR logger restAPI for any number of simulated meters.
+
+    Every meter lives under its own path prefix, http://<server>/<meter>,
+    so the url of a meter can be used as the host of a coordinator.
+    """
+
+    def __init__(
+        self,
+        latency=0.0,
+        jitter=0.0,
+        extra_fields=0,
+        hist_records=48,
+        failure_rate=0.0,
+        seed=0,
+    ):
+        """Initialize the simulated loggers."""
+        self.latency = latency
+        self.jitter = jitter
+        self.extra_fields = extra_fields
+        self.hist_records = hist_records
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+        self._readings = {}
+        self._server = None
+
+    def meter_url(self, meter):
+        """Return the url of a simulated meter."""
+        return str(self._server.make_url(f"/{meter}"))
+
+    async def start(self):
+        """Start the server on a free local port."""
+        app = web.Application()
+        app.router.add_get("/{meter}/api/v1/sm/actual", self._handle_actual)
+        app.router.add_get("/{meter}/api/v1/hist/{period}", self._handle_hist)
+        app.router.add_get("/{meter}/api/v1/dev/info", self._handle_info)
+        self._server = TestServer(app)
+        await self._server.start_server()
+
+    async def close(self):
+        """Stop the server."""
+        await self._server.close()
+
+    def _reading(self, meter):
+        """Return the running total of a meter, it increases on every request."""
+        total = self._readings.get(meter, 10000.0) + self._random.random()
+        self._readings[meter] = total
+        return total
+
+    async def _respond(self):
+        """Apply the configured latency and failure rate to a request."""
+        self.requests += 1
+        delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self._random.random() < self.failure_rate:
+            self.failures += 1
+            raise web.HTTPInternalServerError()
+
+    async def _handle_actual(self, request):
+        """Serve /api/v1/sm/actual."""
+        await self._respond()
+        total = self._reading(request.match_info["meter"])
+        actual = [
+            {"name": "timestamp", "value": f"{self.requests:012d}W"},
+            {"name": "energy_delivered_tariff1", "value": total, "unit": "kWh"},
+            {"name": "energy_delivered_tariff2", "value": total / 2, "unit": "kWh"},
+            {"name": "energy_returned_tariff1", "value": 1078.85, "unit": "kWh"},
+            {"name": "energy_returned_tariff2", "value": 2320.433, "unit": "kWh"},
+            {"name": "power_delivered", "value": total % 5, "unit": "kW"},
+            {"name": "power_returned", "value": 0.0, "unit": "kW"},
+            {"name": "voltage_l1", "value": 227.3, "unit": "V"},
+            {"name": "current_l1", "value": 14, "unit": "A"},
+            {"name": "power_delivered_l1", "value": total % 5, "unit": "kW"},
+            {"name": "power_returned_l1", "value": 0.0, "unit": "kW"},
+            {"name": "gas_delivered", "value": total / 3, "unit": "m3"},
+        ]
+        actual.extend(
+            {"name": f"extra_field_{index}", "value": index, "unit": ""}
+            for index in range(self.extra_fields)
+        )
+        return web.json_response({"actual": actual})
+
+    async def _handle_hist(self, request):
+        """Serve /api/v1/hist/{hours,days,months}."""
+        period = request.match_info["period"]
+        if period not in HIST_PERIODS:
+            raise web.HTTPNotFound()
+        await self._respond()
+        total = self._reading(request.match_info["meter"])
+        records = [
+            {
+                "recnr": index,
+                "recid": f"{20120711 - index:08d}",
+                "slot": self.hist_records - index,
+                "edt1": total - index,
+                "edt2": total / 2 - index,
+                "ert1": 1078.85,
+                "ert2": 2320.433,
+                "gdt": total / 3 - index / 10,
+            }
+            for index in range(self.hist_records)
+        ]
+        return web.json_response({period: records})
+
+    async def _handle_info(self, request):
+        """Serve /api/v1/dev/info."""
+        await self._respond()
+        return web.json_response({"devinfo": [{"name": "author", "value": "fake"}]})
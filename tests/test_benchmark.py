@@ -0,0 +1,178 @@
+"""Benchmarks for polling and parsing the DSMR logger responses.
+
+The cycle benchmarks run against a local stand-in for the DSMR logger. By
+default only a few meters are simulated, set DSMR_BENCH=1 to run the full
+suite up to 500 meters. Every result is printed as a JSON line and appended
+to the file named by DSMR_BENCH_OUTPUT, if set.
+"""
+import asyncio
+import copy
+import json
+import os
+import time
+import timeit
+
+import pytest
+
+from homeassistant.components.custom_dsmr.api import (
+    DSMRHistData,
+    DSMRLiveData,
+    create_session,
+)
+from homeassistant.components.custom_dsmr.const import API_V1_ACTUAL, API_V1_HIST_HOURS
+from homeassistant.components.custom_dsmr.coordinator import DSMRCoordinator
+
+from .fake_dsmr_logger import FakeDSMRLogger
+from .test_sensor import dsmr_live_json, dsmr_live_parsed
+
+TELEGRAMS = 2000
+CYCLES = 5
+FULL_SUITE = bool(os.environ.get("DSMR_BENCH"))
+
+
+def record_result(benchmark, **values):
+    """Print a benchmark result and append it to the output file."""
+    line = json.dumps({"benchmark": benchmark, **values}, sort_keys=True)
+    print(line)
+    output = os.environ.get("DSMR_BENCH_OUTPUT")
+    if output:
+        with open(output, "a") as output_file:
+            output_file.write(line + "\n")
+
+
+class LoopMonitor:
+    """Measure how long the event loop is blocked while a benchmark runs."""
+
+    def __init__(self, interval=0.005):
+        """Initialize the monitor."""
+        self.interval = interval
+        self.max_lag = 0.0
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.max_lag = max(self.max_lag, loop.time() - start - self.interval)
+
+    def __enter__(self):
+        """Start measuring."""
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    def __exit__(self, *args):
+        """Stop measuring."""
+        self._task.cancel()
+
+
+def legacy_parse_live_data(json_data):
+    """Parse the actual response the way it was done before, for reference."""
+    formatted = {}
+    for received in json_data["actual"]:
+        formatted[received.pop("name")] = received
+    return {name: formatted[name].get("value", 0) for name in formatted}
+
+
+def test_parse_live_data_benchmark():
+    """Compare the cost per telegram of the flat parse with the legacy parse."""
+    live_data = DSMRLiveData(None, None)
+
+    # The legacy parse mutates its input, every run gets its own copy. The
+    # copies are made up front so only the parsing itself is timed.
+    copies = [copy.deepcopy(dsmr_live_json) for _ in range(TELEGRAMS)]
+    legacy = timeit.timeit(
+        lambda: legacy_parse_live_data(copies.pop()), number=TELEGRAMS
+    )
+    flat = timeit.timeit(
+        lambda: live_data.parse_live_data(dsmr_live_json), number=TELEGRAMS
+    )
+
+    record_result(
+        "parse_live_data",
+        legacy_us_per_telegram=legacy / TELEGRAMS * 1e6,
+        flat_us_per_telegram=flat / TELEGRAMS * 1e6,
+    )
+    assert live_data.data == dsmr_live_parsed
+    assert all("name" in received for received in dsmr_live_json["actual"])
+
+
+@pytest.mark.parametrize("meters", [1, 10, 100, 500])
+@pytest.mark.parametrize("latency", [0.0, 0.05])
+async def test_poll_cycle_benchmark(hass, meters, latency):
+    """Measure the time to poll every simulated meter once."""
+    if meters > 10 and not FULL_SUITE:
+        pytest.skip("set DSMR_BENCH=1 to simulate more meters")
+
+    logger = FakeDSMRLogger(latency=latency, jitter=latency / 2, failure_rate=0.01)
+    await logger.start()
+    semaphore = asyncio.Semaphore(4)
+    coordinators = [
+        DSMRCoordinator(
+            hass,
+            create_session(hass),
+            {"host": logger.meter_url(meter)},
+            semaphore=semaphore,
+        )
+        for meter in range(meters)
+    ]
+
+    cycle_times = []
+    with LoopMonitor() as monitor:
+        for _ in range(CYCLES):
+            start = time.perf_counter()
+            await asyncio.gather(
+                *[coordinator.async_refresh() for coordinator in coordinators]
+            )
+            cycle_times.append(time.perf_counter() - start)
+
+    parse_times = [
+        coordinator.live_data.stats.parse_time
+        for coordinator in coordinators
+        if coordinator.live_data.stats.parse_time is not None
+    ]
+    record_result(
+        "poll_cycle",
+        meters=meters,
+        latency=latency,
+        cycle_time_mean=sum(cycle_times) / len(cycle_times),
+        cycle_time_max=max(cycle_times),
+        parse_time_mean=sum(parse_times) / max(len(parse_times), 1),
+        loop_lag_max=monitor.max_lag,
+        requests=logger.requests,
+        failures=logger.failures,
+    )
+    for coordinator in coordinators:
+        await coordinator.session.close()
+    await logger.close()
+    assert logger.requests == meters * CYCLES
+
+
+@pytest.mark.parametrize("hist_records", [48, 480])
+@pytest.mark.parametrize("extra_fields", [0, 100])
+async def test_payload_size_benchmark(hass, hist_records, extra_fields):
+    """Measure the parse cost of large live and history responses."""
+    logger = FakeDSMRLogger(extra_fields=extra_fields, hist_records=hist_records)
+    await logger.start()
+    session = create_session(hass)
+    live_data = DSMRLiveData(session, logger.meter_url(0) + API_V1_ACTUAL)
+    hist_data = DSMRHistData(session, logger.meter_url(0) + API_V1_HIST_HOURS, "hours")
+
+    with LoopMonitor() as monitor:
+        await live_data.async_update()
+        await hist_data.async_update()
+
+    record_result(
+        "payload_size",
+        hist_records=hist_records,
+        extra_fields=extra_fields,
+        live_payload_size=live_data.stats.payload_size,
+        live_parse_time=live_data.stats.parse_time,
+        hist_payload_size=hist_data.stats.payload_size,
+        hist_parse_time=hist_data.stats.parse_time,
+        loop_lag_max=monitor.max_lag,
+    )
+    await session.close()
+    await logger.close()
+    assert len(hist_data.history) == hist_records
+    assert "extra_field_0" not in live_data.data
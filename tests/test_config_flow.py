@@ -65,3 +65,160 @@ async def test_cannont_connect_form(hass):
     assert result["type"] == "create_entry"
     assert result["title"] == "custom_dsmr"
     assert len(mock_setup_entry.mock_calls) == 1
+
+
+async def test_multiple_hosts_form(hass):
+    """Test if a comma separated list of hosts creates one entry."""
+    result = await hass.config_entries.flow.async_init(
+        DOMAIN, context={"source": config_entries.SOURCE_USER}
+    )
+    with patch(
+        "homeassistant.components.custom_dsmr.config_flow.DSMRSetup.check_host",
+        return_value=True,
+    ) as mock_check_host, patch(
+        "homeassistant.components.custom_dsmr.async_setup_entry",
+        return_value=True,
+    ):
+        result = await hass.config_entries.flow.async_configure(
+            result["flow_id"],
+            {
+                "host": "1.1.1.1, http://1.1.1.2/ ,1.1.1.3:8080",
+                "history_hour": False,
+                "history_day": False,
+                "history_month": False,
+            },
+        )
+        await hass.async_block_till_done()
+    assert result["type"] == "create_entry"
+    assert result["data"]["host"] == "http://1.1.1.1"
+    assert result["data"]["hosts"] == [
+        "http://1.1.1.1",
+        "http://1.1.1.2",
+        "http://1.1.1.3:8080",
+    ]
+    assert len(mock_check_host.mock_calls) == 3
+
+
+async def test_p1_bridge_form(hass):
+    """Test if a meter read from a P1 bridge only needs a logger for history."""
+    result = await hass.config_entries.flow.async_init(
+        DOMAIN, context={"source": config_entries.SOURCE_USER}
+    )
+    with patch(
+        "homeassistant.components.custom_dsmr.config_flow.DSMRSetup.check_host",
+        return_value=False,
+    ) as mock_check_host, patch(
+        "homeassistant.components.custom_dsmr.async_setup_entry",
+        return_value=True,
+    ):
+        result = await hass.config_entries.flow.async_configure(
+            result["flow_id"],
+            {"host": "1.1.1.1", "history_hour": True, "p1_source": "p1-bridge:8088"},
+        )
+        assert result["errors"] == {"base": "cannot_connect"}
+        assert mock_check_host.call_count == 1
+
+        result = await hass.config_entries.flow.async_configure(
+            result["flow_id"], {"host": "1.1.1.1", "p1_source": "p1-bridge:8088"}
+        )
+        await hass.async_block_till_done()
+    assert result["type"] == "create_entry"
+    assert result["data"]["p1_source"] == "p1-bridge:8088"
+    assert mock_check_host.call_count == 1
+
+
+async def test_invalid_p1_source_form(hass):
+    """Test if a P1 port that is not a serial port or host:port is rejected."""
+    result = await hass.config_entries.flow.async_init(
+        DOMAIN, context={"source": config_entries.SOURCE_USER}
+    )
+    with patch(
+        "homeassistant.components.custom_dsmr.config_flow.DSMRSetup.check_host",
+        return_value=True,
+    ) as mock_check_host:
+        result = await hass.config_entries.flow.async_configure(
+            result["flow_id"], {"host": "1.1.1.1", "p1_source": "p1-bridge"}
+        )
+    assert result["type"] == "form"
+    assert result["errors"] == {"p1_source": "invalid_p1_source"}
+    assert mock_check_host.call_count == 0
+
+
+async def test_scan_form(hass):
+    """Test if an empty host scans the subnet and fills in the loggers found."""
+    result = await hass.config_entries.flow.async_init(
+        DOMAIN, context={"source": config_entries.SOURCE_USER}
+    )
+    with patch(
+        "homeassistant.components.custom_dsmr.config_flow.get_local_ip",
+        return_value="192.168.1.42",
+    ):
+        result = await hass.config_entries.flow.async_configure(
+            result["flow_id"], {"host": ""}
+        )
+        assert result["step_id"] == "scan"
+        assert result["data_schema"]({})["subnet"] == "192.168.1.0/24"
+
+        with patch(
+            "homeassistant.components.custom_dsmr.config_flow.async_scan_subnet",
+            return_value=[],
+        ):
+            result = await hass.config_entries.flow.async_configure(
+                result["flow_id"], {"subnet": "192.168.1.0/24"}
+            )
+        assert result["step_id"] == "scan"
+        assert result["errors"] == {"base": "no_devices_found"}
+
+        result = await hass.config_entries.flow.async_configure(
+            result["flow_id"], {"subnet": "192.168.0.0/16"}
+        )
+        assert result["errors"] == {"base": "invalid_subnet"}
+
+    with patch(
+        "homeassistant.components.custom_dsmr.config_flow.async_scan_subnet",
+        return_value=["http://192.168.1.7", "http://192.168.1.9"],
+    ):
+        result = await hass.config_entries.flow.async_configure(
+            result["flow_id"], {"subnet": "192.168.1.0/24"}
+        )
+    assert result["step_id"] == "user"
+    assert result["data_schema"]({})["host"] == "http://192.168.1.7, http://192.168.1.9"
+
+
+async def test_zeroconf_form(hass):
+    """Test if a DSMR logger announced over mDNS is offered for setup."""
+    discovery_info = {
+        "host": "192.168.1.7",
+        "port": 80,
+        "hostname": "dsmr-api.local.",
+        "type": "_http._tcp.local.",
+        "name": "dsmr-api._http._tcp.local.",
+        "properties": {},
+    }
+    result = await hass.config_entries.flow.async_init(
+        DOMAIN, context={"source": config_entries.SOURCE_ZEROCONF}, data=discovery_info
+    )
+    assert result["type"] == "form"
+    assert result["step_id"] == "user"
+    assert result["data_schema"]({})["host"] == "http://192.168.1.7"
+
+    with patch(
+        "homeassistant.components.custom_dsmr.config_flow.DSMRSetup.check_host",
+        return_value=True,
+    ), patch(
+        "homeassistant.components.custom_dsmr.async_setup_entry",
+        return_value=True,
+    ):
+        result = await hass.config_entries.flow.async_configure(
+            result["flow_id"], {"host": "http://192.168.1.7"}
+        )
+        await hass.async_block_till_done()
+    assert result["type"] == "create_entry"
+    assert result["data"]["hosts"] == ["http://192.168.1.7"]
+
+    # The logger is only offered once.
+    result = await hass.config_entries.flow.async_init(
+        DOMAIN, context={"source": config_entries.SOURCE_ZEROCONF}, data=discovery_info
+    )
+    assert result["type"] == "abort"
+    assert result["reason"] == "already_configured"
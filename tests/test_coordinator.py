@@ -0,0 +1,266 @@
+"""Tests for the custom dsmr update coordinator."""
+import asyncio
+from datetime import timedelta
+
+from homeassistant.components.custom_dsmr.breaker import CircuitBreaker
+from homeassistant.components.custom_dsmr.const import HOST_CONNECTION_LIMIT
+from homeassistant.components.custom_dsmr.coordinator import DSMRCoordinator
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.util import dt as dt_util
+from tests.async_mock import AsyncMock, patch
+
+entry_data = {
+    "host": "http://192.168.1.121",
+    "history_hour": True,
+    "history_day": False,
+    "history_month": True,
+}
+
+live_parsed = {
+    "power_delivered": 3.264,
+    "gas_delivered": 4394.229,
+}
+
+hours_formatted = {
+    "energy_hours_delivered_0": 0.197,
+    "gas_hours_delivered_0": 0.0,
+}
+
+
+async def test_coordinator_periods(hass):
+    """Test if only the configured history endpoints are polled."""
+    coordinator = DSMRCoordinator(hass, async_get_clientsession(hass), entry_data)
+    assert coordinator.periods == ["actual", "hours", "months"]
+    assert (
+        coordinator.hist_data["hours"].api == "http://192.168.1.121/api/v1/hist/hours"
+    )
+
+
+async def test_coordinator_snapshot(hass):
+    """Test if one refresh polls every endpoint once and merges the results."""
+    coordinator = DSMRCoordinator(hass, async_get_clientsession(hass), entry_data)
+    coordinator.live_data.async_update = AsyncMock(return_value=True)
+    coordinator.live_data._data = live_parsed  # pylint: disable=protected-access
+    for hist_data in coordinator.hist_data.values():
+        hist_data.async_update = AsyncMock()
+    hours_data = coordinator.hist_data["hours"]
+    hours_data._data = hours_formatted  # pylint: disable=protected-access
+    for schedule in coordinator.schedules.values():
+        schedule.force()
+
+    await coordinator.async_refresh()
+
+    assert coordinator.last_update_success
+    assert coordinator.live_data.async_update.call_count == 1
+    assert coordinator.hist_data["hours"].async_update.call_count == 1
+    assert coordinator.hist_data["months"].async_update.call_count == 1
+    assert coordinator.data == {
+        "power_delivered": 3.264,
+        "gas_delivered": 4394.229,
+        "energy_hours_delivered_0": 0.197,
+        "gas_hours_delivered_0": 0.0,
+    }
+
+
+async def test_coordinator_no_live_data(hass):
+    """Test if a failed live request marks the update as failed."""
+    coordinator = DSMRCoordinator(hass, async_get_clientsession(hass), entry_data)
+    coordinator.live_data.async_update = AsyncMock(return_value=False)
+    for hist_data in coordinator.hist_data.values():
+        hist_data.async_update = AsyncMock(return_value=False)
+    await coordinator.async_refresh()
+    assert not coordinator.last_update_success
+
+
+async def test_coordinator_adaptive_interval(hass):
+    """Test if the live interval backs off on repeated telegrams and recovers."""
+    config = dict(entry_data, live_interval=1)
+    coordinator = DSMRCoordinator(hass, async_get_clientsession(hass), config)
+    assert coordinator.update_interval == timedelta(seconds=1)
+
+    coordinator.adapt_interval(0.05, "201207113025W")
+    assert coordinator.update_interval == timedelta(seconds=1)
+    # Same telegram twice: the logger did not refresh yet.
+    coordinator.adapt_interval(0.05, "201207113025W")
+    assert coordinator.update_interval == timedelta(seconds=2)
+    # A slow answer backs off to twice the latency.
+    coordinator.adapt_interval(1.5, "201207113026W")
+    assert coordinator.update_interval == timedelta(seconds=4)
+    # The backoff is capped at a multiple of the configured interval.
+    for _ in range(10):
+        coordinator.adapt_interval(0.05, "201207113026W")
+    assert coordinator.update_interval == timedelta(seconds=8)
+    # Fresh telegrams return to the configured interval.
+    for second in range(20):
+        coordinator.adapt_interval(0.05, f"2012071131{second:02}W")
+    assert coordinator.update_interval == timedelta(seconds=1)
+
+
+async def test_coordinator_unchanged_snapshot(hass):
+    """Test if an unchanged poll hands back the previous snapshot object."""
+    coordinator = DSMRCoordinator(hass, async_get_clientsession(hass), entry_data)
+    coordinator.live_data.async_update = AsyncMock(return_value=True)
+    coordinator.live_data._data = live_parsed  # pylint: disable=protected-access
+    for hist_data in coordinator.hist_data.values():
+        hist_data.async_update = AsyncMock()
+
+    await coordinator.async_refresh()
+    first = coordinator.data
+    await coordinator.async_refresh()
+    assert coordinator.data is first
+
+
+async def test_coordinator_concurrent_requests(hass):
+    """Test if the live data and the history are requested at once."""
+    config = dict(entry_data, history_day=True)
+    coordinator = DSMRCoordinator(
+        hass, async_get_clientsession(hass), config, semaphore=asyncio.Semaphore(4)
+    )
+    running = []
+    peak = []
+    history_started = asyncio.Event()
+
+    async def request(received):
+        running.append(received)
+        peak.append(len(running))
+        await asyncio.sleep(0)
+        running.pop()
+        return received
+
+    async def live_update():
+        # Only returns when a history request runs at the same time.
+        await asyncio.wait_for(history_started.wait(), 1)
+        return await request(True)
+
+    async def hist_update():
+        history_started.set()
+        return await request(True)
+
+    coordinator.live_data.async_update = live_update
+    coordinator.live_data._data = live_parsed  # pylint: disable=protected-access
+    for hist_data in coordinator.hist_data.values():
+        hist_data.async_update = hist_update
+    for schedule in coordinator.schedules.values():
+        schedule.force()
+
+    await coordinator.async_refresh()
+    assert coordinator.last_update_success
+    assert max(peak) == HOST_CONNECTION_LIMIT
+    now = dt_util.utcnow()
+    assert not any(schedule.due(now) for schedule in coordinator.schedules.values())
+
+
+async def test_coordinator_partial_results(hass):
+    """Test if the live data is published before the history arrived."""
+    coordinator = DSMRCoordinator(
+        hass, async_get_clientsession(hass), entry_data, semaphore=asyncio.Semaphore(4)
+    )
+    coordinator.live_data.async_update = AsyncMock(return_value=True)
+    coordinator.live_data._data = live_parsed  # pylint: disable=protected-access
+    for hist_data in coordinator.hist_data.values():
+        hist_data.async_update = AsyncMock(return_value=True)
+    await coordinator.async_refresh()
+
+    published = []
+    coordinator.async_add_listener(lambda: published.append(coordinator.data))
+    release = asyncio.Event()
+
+    async def slow_hist_update():
+        await release.wait()
+        return True
+
+    coordinator.hist_data["hours"].async_update = slow_hist_update
+    coordinator.schedules["hours"].force()
+    coordinator.live_data._data = dict(  # pylint: disable=protected-access
+        live_parsed, power_delivered=1.5
+    )
+    refresh = hass.async_create_task(coordinator.async_refresh())
+    await asyncio.sleep(0.01)
+    assert published[-1]["power_delivered"] == 1.5
+    assert not refresh.done()
+
+    release.set()
+    await refresh
+    assert coordinator.last_update_success
+
+
+def test_circuit_breaker():
+    """Test if the breaker opens, backs off and closes again."""
+    breaker = CircuitBreaker(threshold=3, backoff_base=30, backoff_max=100, jitter=0)
+    assert breaker.allow_request(now=0)
+    breaker.record_failure(now=0)
+    breaker.record_failure(now=0)
+    assert breaker.allow_request(now=0)
+    breaker.record_failure(now=0)
+    assert breaker.state == "open"
+    assert not breaker.allow_request(now=29)
+
+    # The probe fails: the backoff doubles.
+    assert breaker.allow_request(now=30)
+    assert breaker.half_open
+    breaker.record_failure(now=30)
+    assert not breaker.allow_request(now=89)
+    assert breaker.allow_request(now=90)
+    # And is capped.
+    breaker.record_failure(now=90)
+    assert not breaker.allow_request(now=189)
+    assert breaker.allow_request(now=190)
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow_request(now=190)
+
+
+async def test_coordinator_circuit_breaker(hass):
+    """Test if an unreachable logger is not polled while the breaker is open."""
+    coordinator = DSMRCoordinator(hass, async_get_clientsession(hass), entry_data)
+    coordinator.live_data.async_update = AsyncMock(return_value=False)
+    for hist_data in coordinator.hist_data.values():
+        hist_data.async_update = AsyncMock(return_value=False)
+    for _ in range(3):
+        await coordinator.async_refresh()
+    assert coordinator.live_data.async_update.call_count == 3
+    assert coordinator.breaker.state == "open"
+
+    await coordinator.async_refresh()
+    assert coordinator.live_data.async_update.call_count == 3
+    assert not coordinator.last_update_success
+
+    # Once the backoff passed the device info endpoint is probed first.
+    coordinator.breaker.retry_at = 0
+    with patch(
+        "homeassistant.components.custom_dsmr.coordinator.async_probe",
+        return_value=True,
+    ) as mock_probe:
+        coordinator.live_data.async_update.return_value = True
+        coordinator.live_data._data = live_parsed  # pylint: disable=protected-access
+        for hist_data in coordinator.hist_data.values():
+            hist_data.async_update.return_value = True
+        await coordinator.async_refresh()
+    assert mock_probe.call_args[0][1] == "http://192.168.1.121/api/v1/dev/info"
+    assert coordinator.live_data.async_update.call_count == 4
+    assert coordinator.last_update_success
+    assert coordinator.breaker.state == "closed"
+
+
+async def test_coordinator_serves_stale_snapshot(hass):
+    """Test if the last snapshot is served during a short outage."""
+    config = dict(entry_data, stale_ttl=300)
+    coordinator = DSMRCoordinator(hass, async_get_clientsession(hass), config)
+    coordinator.live_data.async_update = AsyncMock(return_value=True)
+    coordinator.live_data._data = live_parsed  # pylint: disable=protected-access
+    coordinator.live_data.fetched = dt_util.utcnow()
+    for hist_data in coordinator.hist_data.values():
+        hist_data.async_update = AsyncMock()
+    await coordinator.async_refresh()
+    snapshot = coordinator.data
+
+    coordinator.live_data.async_update.return_value = False
+    await coordinator.async_refresh()
+    assert coordinator.last_update_success
+    assert coordinator.data is snapshot
+
+    # Too old to be shown.
+    coordinator.live_data.fetched = dt_util.utcnow() - timedelta(seconds=301)
+    await coordinator.async_refresh()
+    assert not coordinator.last_update_success
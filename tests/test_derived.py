@@ -0,0 +1,104 @@
+"""Tests for the metrics derived from the live readings."""
+from datetime import datetime, timedelta, timezone
+
+from homeassistant.components.custom_dsmr.derived import DerivedMetrics
+from homeassistant.util import dt as dt_util
+
+
+def live(delivered, power_delivered=1.0, returned=100.0, power_returned=0.25):
+    """Return live readings with the delivered energy split over both tariffs."""
+    return {
+        "energy_delivered_tariff1": delivered / 2,
+        "energy_delivered_tariff2": delivered / 2,
+        "energy_returned_tariff1": returned,
+        "energy_returned_tariff2": 0.0,
+        "power_delivered": power_delivered,
+        "power_returned": power_returned,
+    }
+
+
+def test_derived_totals():
+    """Test if net power and the totals over both tariffs are derived."""
+    metrics = DerivedMetrics()
+    now = datetime(2020, 12, 7, 11, 1, tzinfo=timezone.utc)
+    readings = live(1000.0)
+    derived = metrics.update(readings, now)
+    assert derived == {
+        "net_power": 0.75,
+        "energy_delivered_total": 1000.0,
+        "energy_returned_total": 100.0,
+        "net_energy": 900.0,
+    }
+    # The same readings are not counted twice.
+    assert metrics.update(readings, now + timedelta(seconds=10)) is derived
+    assert metrics.update({"power_delivered": 1.0}, now) == {}
+
+
+def test_derived_demand():
+    """Test the 15 minute average demand and the peak of the quarter hours."""
+    # The quarter hours and months are those of the local time zone.
+    original_time_zone = dt_util.DEFAULT_TIME_ZONE
+    dt_util.set_default_time_zone(dt_util.UTC)
+    try:
+        check_demand(DerivedMetrics())
+    finally:
+        dt_util.set_default_time_zone(original_time_zone)
+
+
+def check_demand(metrics):
+    """Feed the metrics a growing demand and check the average and peak."""
+    start = datetime(2020, 12, 7, 11, 0, tzinfo=timezone.utc)
+
+    # 2 kW during the first quarter hour, one reading every minute.
+    for minute in range(16):
+        derived = metrics.update(
+            live(1000.0 + minute * 2 / 60), start + timedelta(minutes=minute)
+        )
+    assert derived["average_demand"] == 2.0
+    assert derived["peak_demand"] == 2.0
+
+    # 4 kW during the next quarter hour, the window moves along.
+    for minute in range(16, 31):
+        derived = metrics.update(
+            live(1000.5 + (minute - 15) * 4 / 60), start + timedelta(minutes=minute)
+        )
+    assert derived["average_demand"] == 4.0
+    assert derived["peak_demand"] == 4.0
+
+    # The peak starts over in a new month.
+    derived = metrics.update(
+        live(1002.0), datetime(2021, 1, 1, 0, 0, tzinfo=timezone.utc)
+    )
+    derived = metrics.update(
+        live(1002.1), datetime(2021, 1, 1, 0, 15, tzinfo=timezone.utc)
+    )
+    assert derived["peak_demand"] == 0.4
+
+
+def test_derived_peak_restart():
+    """Test if the monthly peak continues from the state restored after a restart."""
+    original_time_zone = dt_util.DEFAULT_TIME_ZONE
+    dt_util.set_default_time_zone(dt_util.UTC)
+    try:
+        start = datetime(2020, 12, 7, 11, 0, tzinfo=timezone.utc)
+        metrics = DerivedMetrics()
+        metrics.restore("peak_demand", 30.0, start - timedelta(days=1), start)
+        metrics.restore("net_power", 1.5, start, start)
+
+        # 0.6 kW during the first quarter hour after the restart.
+        for minute in range(16):
+            derived = metrics.update(
+                live(1000.0 + minute * 0.6 / 60), start + timedelta(minutes=minute)
+            )
+        assert derived["peak_demand"] == 30.0
+
+        # A peak of the previous month is not restored.
+        metrics = DerivedMetrics()
+        metrics.restore("peak_demand", 30.0, start - timedelta(days=7), start)
+        for minute in range(16):
+            derived = metrics.update(
+                live(1000.0 + minute * 0.6 / 60), start + timedelta(minutes=minute)
+            )
+        assert derived["peak_demand"] == 0.6
+    finally:
+        dt_util.set_default_time_zone(original_time_zone)
@@ -0,0 +1,67 @@
+"""Tests for the request statistics and diagnostics of the custom dsmr integration."""
+from homeassistant.components.custom_dsmr.stats import EndpointStats
+from tests.async_mock import patch
+from tests.common import MockConfigEntry, async_capture_events
+
+
+def test_endpoint_stats():
+    """Test the latency percentiles and error counts."""
+    stats = EndpointStats(samples=10)
+    assert stats.percentile(50) is None
+    assert stats.error_rate is None
+
+    for latency in range(1, 21):
+        stats.record_request(latency / 1000, 600, 0.0002)
+    stats.record_timeout()
+    stats.record_client_error()
+    stats.record_client_error()
+
+    # Only the last 10 latencies are kept.
+    assert stats.percentile(50) == 0.015
+    assert stats.percentile(90) == 0.019
+    assert stats.percentile(100) == 0.020
+    assert stats.errors == 3
+    assert stats.as_dict() == {
+        "requests": 23,
+        "timeouts": 1,
+        "client_errors": 2,
+        "parse_errors": 0,
+        "error_rate": 3 / 23,
+        "latency_p50": 15.0,
+        "latency_p90": 19.0,
+        "latency_p99": 20.0,
+        "payload_size": 600,
+        "parse_time": 0.2,
+    }
+
+
+async def test_diagnostics(hass):
+    """Test if the diagnostics hold the statistics of every endpoint."""
+    entry_data = {
+        "host": "http://192.168.1.121",
+        "history_hour": True,
+        "history_day": False,
+        "history_month": False,
+    }
+    mock_entry = MockConfigEntry(domain="custom_dsmr", data=entry_data)
+    mock_entry.add_to_hass(hass)
+    with patch(
+        "homeassistant.components.custom_dsmr.coordinator.DSMRCoordinator._async_update_data",
+        return_value={},
+    ):
+        await hass.config_entries.async_setup(mock_entry.entry_id)
+        await hass.async_block_till_done()
+
+    coordinator = hass.data["custom_dsmr"][mock_entry.entry_id]["http://192.168.1.121"]
+    coordinator.live_data.stats.record_request(0.05, 700, 0.001)
+
+    events = async_capture_events(hass, "custom_dsmr_diagnostics")
+    await hass.services.async_call("custom_dsmr", "diagnostics", blocking=True)
+    assert len(events) == 1
+    diagnostics = events[0].data
+    assert diagnostics["entry_id"] == mock_entry.entry_id
+    logger = diagnostics["loggers"]["http://192.168.1.121"]
+    assert logger["last_update_success"]
+    assert set(logger["endpoints"]) == {"/api/v1/sm/actual", "/api/v1/hist/hours"}
+    assert logger["endpoints"]["/api/v1/sm/actual"]["latency_p50"] == 50.0
+    assert logger["endpoints"]["/api/v1/hist/hours"]["requests"] == 0
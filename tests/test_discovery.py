@@ -0,0 +1,33 @@
+"""Tests for the discovery of DSMR loggers on the local network."""
+import pytest
+
+from homeassistant.components.custom_dsmr.discovery import (
+    async_scan_subnet,
+    default_subnet,
+)
+from tests.async_mock import patch
+
+
+def test_default_subnet():
+    """Test if the /24 subnet around an address is scanned by default."""
+    assert default_subnet("192.168.1.42") == "192.168.1.0/24"
+
+
+async def test_scan_subnet():
+    """Test if every address of the subnet is probed once."""
+    with patch(
+        "homeassistant.components.custom_dsmr.discovery.async_probe",
+        side_effect=lambda session, url, timeout: url.startswith("http://10.0.0.7/"),
+    ) as mock_probe:
+        hosts = await async_scan_subnet(None, "10.0.0.0/28", timeout=0.5)
+    assert hosts == ["http://10.0.0.7"]
+    assert mock_probe.call_count == 14
+    assert mock_probe.call_args[0][1] == "http://10.0.0.14/api/v1/dev/info"
+    assert mock_probe.call_args[0][2] == 0.5
+
+
+@pytest.mark.parametrize("subnet", ["not a subnet", "10.0.0.0/16"])
+async def test_scan_invalid_subnet(subnet):
+    """Test if a subnet that is not valid or too large is refused."""
+    with pytest.raises(ValueError):
+        await async_scan_subnet(None, subnet)
@@ -0,0 +1,155 @@
+"""Tests for reading the P1 telegrams of DSMR meters."""
+import asyncio
+
+import pytest
+
+from homeassistant.components.custom_dsmr.obis import (
+    TelegramError,
+    crc16,
+    parse_telegram,
+)
+from homeassistant.components.custom_dsmr.p1 import P1Listener, parse_p1_source
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+
+TELEGRAM_BODY = (
+    b"/ISk5\\2MT382-1000\r\n"
+    b"\r\n"
+    b"1-3:0.2.8(50)\r\n"
+    b"0-0:1.0.0(201207113025W)\r\n"
+    b"0-0:96.1.1(4B384547303034303436333935353037)\r\n"
+    b"1-0:1.8.1(003154.553*kWh)\r\n"
+    b"1-0:1.8.2(002945.021*kWh)\r\n"
+    b"1-0:2.8.1(001078.850*kWh)\r\n"
+    b"1-0:2.8.2(002320.433*kWh)\r\n"
+    b"0-0:96.14.0(0002)\r\n"
+    b"1-0:1.7.0(03.264*kW)\r\n"
+    b"1-0:2.7.0(00.000*kW)\r\n"
+    b"0-0:96.7.21(00004)\r\n"
+    b"1-0:99.97.0(1)(0-0:96.7.19)(101208152415W)(0000000240*s)\r\n"
+    b"1-0:32.7.0(227.3*V)\r\n"
+    b"1-0:31.7.0(014*A)\r\n"
+    b"1-0:21.7.0(03.264*kW)\r\n"
+    b"1-0:22.7.0(00.000*kW)\r\n"
+    b"0-1:24.1.0(003)\r\n"
+    b"0-1:24.2.1(201207113000W)(04394.229*m3)\r\n"
+    b"!"
+)
+TELEGRAM = TELEGRAM_BODY + b"%04X\r\n" % crc16(TELEGRAM_BODY)
+
+telegram_parsed = {
+    "timestamp": "201207113025W",
+    "energy_delivered_tariff1": 3154.553,
+    "energy_delivered_tariff2": 2945.021,
+    "energy_returned_tariff1": 1078.85,
+    "energy_returned_tariff2": 2320.433,
+    "power_delivered": 3.264,
+    "power_returned": 0.0,
+    "voltage_l1": 227.3,
+    "current_l1": 14.0,
+    "power_delivered_l1": 3.264,
+    "power_returned_l1": 0.0,
+    "gas_delivered": 4394.229,
+}
+
+
+def test_crc16():
+    """Test the CRC16 (ARC) against its check value."""
+    assert crc16(b"123456789") == 0xBB3D
+
+
+def test_parse_telegram():
+    """Test if the readings with a sensor are read from a telegram."""
+    assert parse_telegram(TELEGRAM) == telegram_parsed
+
+
+def test_parse_telegram_without_crc():
+    """Test if a DSMR 2 or 3 telegram without a CRC is read."""
+    assert parse_telegram(TELEGRAM_BODY + b"\r\n") == telegram_parsed
+
+
+@pytest.mark.parametrize(
+    "telegram",
+    [
+        TELEGRAM.replace(b"03.264*kW", b"09.264*kW", 1),
+        TELEGRAM_BODY + b"0000\r\n",
+        TELEGRAM_BODY + b"XYZ\r\n",
+        TELEGRAM[1:],
+        TELEGRAM_BODY[:-1],
+    ],
+)
+def test_parse_telegram_invalid(telegram):
+    """Test if a corrupted or incomplete telegram is rejected."""
+    with pytest.raises(TelegramError):
+        parse_telegram(telegram)
+
+
+async def test_p1_listener(hass):
+    """Test if the telegrams of a P1-to-TCP bridge are read as they arrive."""
+
+    async def handle_client(reader, writer):
+        # The bridge is connected halfway through a telegram, and sends one
+        # corrupted telegram.
+        writer.write(TELEGRAM[100:])
+        writer.write(TELEGRAM.replace(b"03.264*kW", b"09.264*kW", 1))
+        writer.write(TELEGRAM)
+        await writer.drain()
+
+    server = await asyncio.start_server(handle_client, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    received = asyncio.Queue()
+    listener = P1Listener(hass, f"127.0.0.1:{port}", received.put_nowait)
+
+    await listener.async_start()
+    readings = await asyncio.wait_for(received.get(), 5)
+    listener.async_stop()
+    server.close()
+    await server.wait_closed()
+
+    assert readings == telegram_parsed
+    assert listener.telegrams == 1
+    assert listener.crc_errors == 1
+
+
+async def test_p1_listener_stops_with_home_assistant(hass):
+    """Test if the P1 port is no longer read once Home Assistant stops."""
+    stop_listeners = hass.bus.async_listeners().get(EVENT_HOMEASSISTANT_STOP, 0)
+    listener = P1Listener(hass, "127.0.0.1:1", lambda readings: None)
+    await listener.async_start()
+    task = listener._task  # pylint: disable=protected-access
+
+    hass.bus.async_fire(EVENT_HOMEASSISTANT_STOP)
+    await hass.async_block_till_done()
+    assert task.cancelled()
+    assert hass.bus.async_listeners().get(EVENT_HOMEASSISTANT_STOP, 0) == stop_listeners
+
+    # An unload after the stop has nothing left to stop.
+    listener.async_stop()
+
+
+@pytest.mark.parametrize(
+    "source,parsed",
+    [
+        ("/dev/ttyUSB0", ("/dev/ttyUSB0", None)),
+        ("p1-bridge:8088", ("p1-bridge", 8088)),
+        ("192.168.1.50:23", ("192.168.1.50", 23)),
+    ],
+)
+def test_parse_p1_source(source, parsed):
+    """Test if a serial port and a P1-to-TCP bridge are recognized."""
+    assert parse_p1_source(source) == parsed
+
+
+@pytest.mark.parametrize("source", ["p1-bridge", "p1-bridge:", ":8088", "host:p1"])
+def test_parse_p1_source_invalid(source):
+    """Test if a source that is neither a serial port nor host:port is rejected."""
+    with pytest.raises(ValueError):
+        parse_p1_source(source)
+
+
+async def test_p1_listener_invalid_source(hass):
+    """Test if an invalid P1 port is not retried."""
+    listener = P1Listener(hass, "p1-bridge", lambda readings: None)
+    await listener.async_start()
+    task = listener._task  # pylint: disable=protected-access
+    await asyncio.wait_for(task, 1)
+    listener.async_stop()
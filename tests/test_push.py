@@ -0,0 +1,118 @@
+"""Tests for the readings pushed by the DSMR logger over MQTT."""
+from datetime import timedelta
+
+import pytest
+
+from homeassistant.components.custom_dsmr.coordinator import (
+    DSMRCoordinator,
+    config_topics,
+)
+from homeassistant.components.custom_dsmr.push import (
+    DSMRPushListener,
+    parse_mqtt_message,
+)
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.util import dt as dt_util
+from tests.common import async_fire_mqtt_message, async_fire_time_changed
+
+
+@pytest.mark.parametrize(
+    "topic,payload,readings",
+    [
+        ("DSMR-API/power_delivered", "1.5", {"power_delivered": 1.5}),
+        ("DSMR-API/timestamp", "201207113025W", {"timestamp": "201207113025W"}),
+        ("DSMR-API/unknown_reading", "3", {}),
+        (
+            "DSMR-API/power_delivered",
+            '{"power_delivered": [{"value": 1.5, "unit": "kW"}]}',
+            {"power_delivered": 1.5},
+        ),
+        (
+            "DSMR-API",
+            '{"actual": [{"name": "gas_delivered", "value": 4394.229}]}',
+            {"gas_delivered": 4394.229},
+        ),
+        (
+            "DSMR-API/all",
+            '{"power_delivered": 1.5, "voltage_l1": 227.3, "unknown": 1}',
+            {"power_delivered": 1.5, "voltage_l1": 227.3},
+        ),
+    ],
+)
+def test_parse_mqtt_message(topic, payload, readings):
+    """Test if every message format of the DSMR logger firmware is read."""
+    assert parse_mqtt_message(topic, payload) == readings
+
+
+def test_config_topics():
+    """Test if the topics are matched with the hosts in order."""
+    config = {
+        "host": "http://1.2.3.4",
+        "hosts": ["http://1.2.3.4", "http://1.2.3.5"],
+        "mqtt_topic": "dsmr-1",
+    }
+    assert config_topics(config) == {
+        "http://1.2.3.4": "dsmr-1",
+        "http://1.2.3.5": None,
+    }
+    assert config_topics({"host": "http://1.2.3.4"}) == {"http://1.2.3.4": None}
+
+
+async def test_coordinator_push(hass, mqtt_mock):
+    """Test if the pushed readings of a telegram update the data at once."""
+    coordinator = DSMRCoordinator(
+        hass,
+        async_get_clientsession(hass),
+        {"host": "http://1.2.3.4"},
+        topic="DSMR-API",
+    )
+    await coordinator.async_start_push()
+    updates = []
+    coordinator.async_add_listener(lambda: updates.append(coordinator.data))
+
+    async_fire_mqtt_message(hass, "DSMR-API/power_delivered", "1.5")
+    async_fire_mqtt_message(hass, "DSMR-API/gas_delivered", "4394.229")
+    await hass.async_block_till_done()
+    assert updates == []
+
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=2))
+    await hass.async_block_till_done()
+    assert updates == [{"power_delivered": 1.5, "gas_delivered": 4394.229}]
+    assert coordinator.live_data.fetched is not None
+
+    # A reading that did not change does not update the sensors.
+    async_fire_mqtt_message(hass, "DSMR-API/power_delivered", "1.5")
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=4))
+    await hass.async_block_till_done()
+    assert len(updates) == 1
+
+    coordinator.async_stop_push()
+    async_fire_mqtt_message(hass, "DSMR-API/power_delivered", "2.0")
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=6))
+    await hass.async_block_till_done()
+    assert len(updates) == 1
+
+
+async def test_coordinator_push_stopped(hass):
+    """Test if the update fails once the DSMR logger stops pushing."""
+    coordinator = DSMRCoordinator(
+        hass,
+        async_get_clientsession(hass),
+        {"host": "http://1.2.3.4", "stale_ttl": 60},
+        topic="DSMR-API",
+    )
+    coordinator.async_push({"power_delivered": 1.5})
+    await coordinator.async_refresh()
+    assert coordinator.last_update_success
+    assert coordinator.data == {"power_delivered": 1.5}
+
+    coordinator.live_data.fetched = dt_util.utcnow() - timedelta(seconds=120)
+    await coordinator.async_refresh()
+    assert not coordinator.last_update_success
+
+
+async def test_push_without_mqtt(hass, caplog):
+    """Test if a missing MQTT integration is logged instead of raised."""
+    listener = DSMRPushListener(hass, "DSMR-API", lambda readings: None)
+    await listener.async_start()
+    assert "MQTT is not set up" in caplog.text
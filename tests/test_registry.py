@@ -0,0 +1,68 @@
+"""Tests for the sensor descriptions of the custom dsmr integration."""
+import pytest
+
+from homeassistant.components.custom_dsmr.const import SENSOR_FORMAT
+from homeassistant.components.custom_dsmr.registry import (
+    SensorDescription,
+    SensorRegistry,
+)
+
+
+def test_sensor_format_indexes():
+    """Test if every sensor is found by its period and utility."""
+    assert SENSOR_FORMAT["energy_days_delivered_1"].period == "days"
+    assert SENSOR_FORMAT["energy_months_returned_1"].period == "months"
+    assert SENSOR_FORMAT["gas_delivered"].name == "Gas delivered"
+    assert SENSOR_FORMAT["voltage_l1"].deadband == 0.5
+    assert SENSOR_FORMAT.get("unknown") is None
+    assert SENSOR_FORMAT["net_power"].period == "derived"
+
+    periods = ("actual", "derived", "hours", "days", "months")
+    assert sum(len(SENSOR_FORMAT.for_period(period)) for period in periods) == len(
+        SENSOR_FORMAT
+    )
+    assert {description.key for description in SENSOR_FORMAT.for_period("hours")} == {
+        "energy_hours_delivered_0",
+        "energy_hours_delivered_1",
+        "energy_hours_returned_0",
+        "energy_hours_returned_1",
+        "gas_hours_delivered_0",
+        "gas_hours_delivered_1",
+    }
+    assert [
+        description.key for description in SENSOR_FORMAT.for_periods(["actual"])
+    ] == [description.key for description in SENSOR_FORMAT.for_period("actual")]
+    assert all(
+        description.icon == "mdi:gas"
+        for description in SENSOR_FORMAT.for_utility("gas")
+    )
+
+
+@pytest.mark.parametrize(
+    "descriptions",
+    [
+        [
+            SensorDescription("power_delivered", "kW", "mdi:flash", "energy", "actual"),
+            SensorDescription("power_delivered", "kW", "mdi:flash", "energy", "actual"),
+        ],
+        [SensorDescription("power_delivered", "kW", "mdi:flash", "energy", "")],
+        [SensorDescription("power_delivered", "kW", "mdi:flash", "water", "actual")],
+        [
+            SensorDescription(
+                "energy_days_delivered_1", "kW", "mdi:flash", "energy", "months"
+            )
+        ],
+        [
+            SensorDescription(
+                "energy_months_returned_0", "kW", "mdi:flash", "energy", "months"
+            ),
+            SensorDescription(
+                "energy_months_returned_1", "kWh", "mdi:flash", "energy", "months"
+            ),
+        ],
+    ],
+)
+def test_sensor_registry_inconsistent(descriptions):
+    """Test if an inconsistent sensor table is rejected."""
+    with pytest.raises(ValueError):
+        SensorRegistry(descriptions)
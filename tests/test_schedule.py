@@ -0,0 +1,150 @@
+"""Tests for the schedule of the history requests."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from homeassistant.components.custom_dsmr.coordinator import DSMRCoordinator
+from homeassistant.components.custom_dsmr.schedule import (
+    HistorySchedule,
+    next_rollover,
+)
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.util import dt as dt_util
+from tests.async_mock import AsyncMock
+from tests.test_store import history_columns
+
+
+@pytest.fixture
+def utc_time_zone():
+    """Run the test with UTC as the local time zone."""
+    original_time_zone = dt_util.DEFAULT_TIME_ZONE
+    dt_util.set_default_time_zone(dt_util.UTC)
+    yield
+    dt_util.set_default_time_zone(original_time_zone)
+
+
+@pytest.mark.parametrize(
+    "period,now,rollover",
+    [
+        ("hours", datetime(2020, 12, 7, 11, 30), datetime(2020, 12, 7, 12, 0)),
+        ("days", datetime(2020, 12, 7, 11, 30), datetime(2020, 12, 8, 0, 0)),
+        ("months", datetime(2020, 11, 7, 11, 30), datetime(2020, 12, 1, 0, 0)),
+        ("months", datetime(2020, 12, 31, 23, 59), datetime(2021, 1, 1, 0, 0)),
+    ],
+)
+def test_next_rollover(utc_time_zone, period, now, rollover):
+    """Test if the start of the next period is found."""
+    now = now.replace(tzinfo=timezone.utc)
+    assert next_rollover(period, now) == rollover.replace(tzinfo=timezone.utc)
+
+
+def test_history_schedule(utc_time_zone):
+    """Test if the history is requested once after every rollover."""
+    now = datetime(2020, 12, 7, 11, 30, tzinfo=timezone.utc)
+    schedule = HistorySchedule("http://1.2.3.4", "hours", now)
+    # The first request after a start is spread like the others.
+    assert not schedule.due(now)
+    assert schedule.due(now + schedule.offset)
+
+    schedule.record(now, True)
+    assert not schedule.due(now + timedelta(minutes=29))
+    rollover = datetime(2020, 12, 7, 12, 0, tzinfo=timezone.utc)
+    assert schedule.next_update == rollover + schedule.offset
+    assert timedelta(seconds=30) <= schedule.offset <= timedelta(seconds=630)
+
+    # A failed request is retried within minutes.
+    schedule.record(now, False)
+    assert schedule.due(now + timedelta(minutes=8))
+
+
+def test_history_schedule_head_recid(utc_time_zone):
+    """Test if the next request follows the newest record of the response."""
+    schedule = HistorySchedule("http://1.2.3.4", "days")
+    now = datetime(2020, 12, 7, 0, 20, tzinfo=timezone.utc)
+    assert not schedule.current(now)
+
+    schedule.record(now, True, "20120700")
+    rollover = datetime(2020, 12, 8, 0, 0, tzinfo=timezone.utc)
+    assert schedule.next_update == rollover + schedule.offset
+    assert schedule.current(now)
+    assert not schedule.current(rollover)
+
+    # A logger that did not roll over yet is asked again within minutes.
+    schedule.record(now, True, "20120600")
+    assert schedule.due(now + timedelta(minutes=8))
+    assert not schedule.current(now)
+
+    schedule.record(now, True, "20120700")
+    schedule.force()
+    assert schedule.due(now)
+
+
+def test_live_deltas():
+    """Test if the running period is calculated from the live readings."""
+    history = history_columns(["20120711", "20120710", "20120709"])
+    readings = {
+        "energy_delivered_tariff1": 2.5,
+        "energy_delivered_tariff2": "2.25",
+        "gas_delivered": 2.125,
+    }
+    assert history.live_deltas("hours", readings) == {
+        "energy_hours_delivered_0": 0.75,
+        "gas_hours_delivered_0": 0.125,
+    }
+    assert history_columns(["20120711"]).live_deltas("hours", readings) == {}
+
+
+def test_history_schedule_spread():
+    """Test if every logger and period gets its own, stable offset."""
+    offsets = {
+        HistorySchedule(f"http://10.0.0.{host}", period).offset
+        for host in range(10)
+        for period in ("hours", "days", "months")
+    }
+    assert len(offsets) == 30
+    assert (
+        HistorySchedule("http://10.0.0.1", "hours").offset
+        == HistorySchedule("http://10.0.0.1", "hours").offset
+    )
+
+
+async def test_coordinator_history_schedule(hass):
+    """Test if the history is not requested again before the next rollover."""
+    config = {"host": "http://1.2.3.4", "history_hour": True, "history_month": True}
+    coordinator = DSMRCoordinator(hass, async_get_clientsession(hass), config)
+    coordinator.live_data.async_update = AsyncMock(return_value=True)
+    for hist_data in coordinator.hist_data.values():
+        hist_data.async_update = AsyncMock(return_value=True)
+
+    await coordinator.async_refresh()
+    assert coordinator.hist_data["hours"].async_update.call_count == 0
+    assert coordinator.hist_data["months"].async_update.call_count == 0
+
+    for schedule in coordinator.schedules.values():
+        schedule.next_update = dt_util.utcnow()
+    await coordinator.async_refresh()
+    await coordinator.async_refresh()
+    assert coordinator.live_data.async_update.call_count == 3
+    assert coordinator.hist_data["hours"].async_update.call_count == 1
+    assert coordinator.hist_data["months"].async_update.call_count == 1
+
+    coordinator.schedules["hours"].next_update = dt_util.utcnow()
+    await coordinator.async_refresh()
+    assert coordinator.hist_data["hours"].async_update.call_count == 2
+    assert coordinator.hist_data["months"].async_update.call_count == 1
+
+
+async def test_coordinator_refresh_history(hass):
+    """Test if a refresh requests the history before the next rollover."""
+    config = {"host": "http://1.2.3.4", "history_hour": True, "history_day": True}
+    coordinator = DSMRCoordinator(hass, async_get_clientsession(hass), config)
+    coordinator.live_data.async_update = AsyncMock(return_value=True)
+    for hist_data in coordinator.hist_data.values():
+        hist_data.async_update = AsyncMock(return_value=True)
+    await coordinator.async_refresh()
+
+    await coordinator.async_refresh_history(["days"])
+    await hass.async_block_till_done()
+    await coordinator.async_refresh()
+    assert coordinator.hist_data["hours"].async_update.call_count == 0
+    assert coordinator.hist_data["days"].async_update.call_count == 1
@@ -1,14 +1,21 @@
 """Tests for the dsmr sensors. Includes tests for message parsing and sensor updates."""
-from homeassistant.components.custom_dsmr.const import (API_V1_ACTUAL,
-                                                        API_V1_HIST_DAYS,
-                                                        API_V1_HIST_HOURS,
-                                                        API_V1_HIST_MONTHS)
-from homeassistant.components.custom_dsmr.sensor import (DSMRHistData,
-                                                         DSMRLiveData,
-                                                         DSMRSensor)
+from datetime import timedelta
+
+from homeassistant.components.custom_dsmr.api import DSMRHistData, DSMRLiveData
+from homeassistant.components.custom_dsmr.const import (
+    API_V1_ACTUAL,
+    API_V1_HIST_DAYS,
+    API_V1_HIST_HOURS,
+    API_V1_HIST_MONTHS,
+)
+from homeassistant.components.custom_dsmr.coordinator import DSMRCoordinator
+from homeassistant.components.custom_dsmr.sensor import DSMRSensor
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE
+from homeassistant.core import State
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
-from tests.async_mock import AsyncMock
-from tests.common import MockConfigEntry
+from homeassistant.util import dt as dt_util
+from tests.async_mock import AsyncMock, patch
+from tests.common import MockConfigEntry, mock_restore_cache
 
 dsmr_live_json = {
     "actual": [
@@ -28,18 +35,18 @@ dsmr_live_json = {
 }
 
 dsmr_live_parsed = {
-    "timestamp": {"value": "201207113025W"},
-    "energy_delivered_tariff1": {"value": 10497.653, "unit": "kWh"},
-    "energy_delivered_tariff2": {"value": 11101.499, "unit": "kWh"},
-    "energy_returned_tariff1": {"value": 1078.85, "unit": "kWh"},
-    "energy_returned_tariff2": {"value": 2320.433, "unit": "kWh"},
-    "power_delivered": {"value": 3.264, "unit": "kW"},
-    "power_returned": {"value": 0.0, "unit": "kW"},
-    "voltage_l1": {"value": 227.3, "unit": "V"},
-    "current_l1": {"value": 14, "unit": "A"},
-    "power_delivered_l1": {"value": 3.24, "unit": "kW"},
-    "power_returned_l1": {"value": 0.0, "unit": "kW"},
-    "gas_delivered": {"value": 4394.229, "unit": "m3"},
+    "timestamp": "201207113025W",
+    "energy_delivered_tariff1": 10497.653,
+    "energy_delivered_tariff2": 11101.499,
+    "energy_returned_tariff1": 1078.85,
+    "energy_returned_tariff2": 2320.433,
+    "power_delivered": 3.264,
+    "power_returned": 0.0,
+    "voltage_l1": 227.3,
+    "current_l1": 14,
+    "power_delivered_l1": 3.24,
+    "power_returned_l1": 0.0,
+    "gas_delivered": 4394.229,
 }
 
 dsmr_hist_hour_json = {
@@ -213,6 +220,11 @@ async def test_parse_live_data(hass):
     assert live_data.data is None
     live_data.parse_live_data(dsmr_live_json)
     assert live_data.data == dsmr_live_parsed
+    # The response is not modified while parsing.
+    assert dsmr_live_json["actual"][0] == {
+        "name": "timestamp",
+        "value": "201207113025W",
+    }
 
 
 async def test_parse_historical_data_hour(hass):
@@ -251,6 +263,64 @@ async def test_parse_historical_data_month(hass):
     assert month_data.data == dsmr_hist_month_parsed
 
 
+async def test_parse_historical_data_incremental(hass):
+    """Test if a history sync stops parsing at the newest known record."""
+    session = async_get_clientsession(hass)
+    hour_data = DSMRHistData(session, None, "hours")
+    hour_data.parse_historical_data(dsmr_hist_hour_json)
+    known = dsmr_hist_hour_json["hours"]
+
+    # The same ring buffer again: nothing to recalculate.
+    parsed = hour_data.data
+    hour_data.parse_historical_data(dsmr_hist_hour_json)
+    assert hour_data.data is parsed
+
+    # A new hour slot was written. The records after the known head are
+    # never read, so their content does not matter.
+    new_hour = {
+        "recnr": 0,
+        "recid": "20120712",
+        "slot": 45,
+        "edt1": 10497.653,
+        "edt2": 11102.247,
+        "ert1": 1078.85,
+        "ert2": 2320.433,
+        "gdt": 4394.55,
+    }
+    hour_data.parse_historical_data({"hours": [new_hour, known[0], {"recnr": 2}]})
+    assert hour_data.data["energy_hours_delivered_0"] == (10497.653 + 11102.247) - (
+        10497.653 + 11102.047
+    )
+    assert hour_data.data["gas_hours_delivered_0"] == 0.0
+    assert (
+        hour_data.data["energy_hours_delivered_1"]
+        == dsmr_hist_hour_parsed["energy_hours_delivered_0"]
+    )
+
+
+async def test_parse_historical_data_went_back(hass):
+    """Test if the history is read again when the logger went back in time."""
+    session = async_get_clientsession(hass)
+    hour_data = DSMRHistData(session, None, "hours")
+    hour_data.parse_historical_data(dsmr_hist_hour_json)
+
+    # After a reset of the logger every record is older than the known head.
+    shifted = [
+        {**record, "recid": f"2011{record['recid'][4:]}"}
+        for record in dsmr_hist_hour_json["hours"][1:]
+    ]
+    hour_data.parse_historical_data({"hours": shifted})
+    assert hour_data.history.head_recid == shifted[0]["recid"]
+    assert len(hour_data.history) == len(shifted)
+    assert (
+        hour_data.data["energy_hours_delivered_0"]
+        == dsmr_hist_hour_parsed["energy_hours_delivered_1"]
+    )
+
+
+live_snapshot = {"timestamp": "201207113025W", "power_delivered": 3.264}
+
+
 async def test_default_setup(hass):
     """Test if only the live sensors are initialized during setup."""
     entry_data = {
@@ -261,16 +331,107 @@ async def test_default_setup(hass):
     }
     mock_entry = MockConfigEntry(domain="custom_dsmr", data=entry_data)
     mock_entry.add_to_hass(hass)
-    await hass.config_entries.async_setup(mock_entry.entry_id)
-    await hass.async_block_till_done()
+    with patch(
+        "homeassistant.components.custom_dsmr.coordinator.DSMRCoordinator._async_update_data",
+        return_value=live_snapshot,
+    ):
+        await hass.config_entries.async_setup(mock_entry.entry_id)
+        await hass.async_block_till_done()
     await hass.helpers.entity_registry.async_get_registry()
     power_delivered = hass.states.get("sensor.power_delivered")
-    assert power_delivered.state == "unknown"
+    assert power_delivered.state == "3.264"
 
     gas_hours_delivered_0 = hass.states.get("sensor.gas_hours_delivered_0")
     assert gas_hours_delivered_0 is None
 
 
+async def test_live_sensors_on_demand(hass):
+    """Test if only the readings the meter reports get a live sensor."""
+    entry_data = {
+        "host": "http://192.168.1.121",
+        "history_hour": False,
+        "history_day": False,
+        "history_month": False,
+    }
+    mock_entry = MockConfigEntry(domain="custom_dsmr", data=entry_data)
+    mock_entry.add_to_hass(hass)
+    with patch(
+        "homeassistant.components.custom_dsmr.coordinator.DSMRCoordinator._async_update_data",
+        return_value=live_snapshot,
+    ):
+        await hass.config_entries.async_setup(mock_entry.entry_id)
+        await hass.async_block_till_done()
+    assert hass.states.get("sensor.power_delivered").state == "3.264"
+    assert hass.states.get("sensor.voltage_l2") is None
+    assert hass.states.get("sensor.timestamp") is None
+
+    # A reading that shows up later gets its sensor then.
+    coordinators = hass.data["custom_dsmr"][mock_entry.entry_id]
+    coordinator = coordinators["http://192.168.1.121"]
+    coordinator.async_set_updated_data(dict(live_snapshot, voltage_l2=229.1))
+    await hass.async_block_till_done()
+    assert hass.states.get("sensor.voltage_l2").state == "229.1"
+    assert len(hass.states.async_entity_ids("sensor")) == 2
+
+    registry = await hass.helpers.entity_registry.async_get_registry()
+    assert registry.async_get_entity_id(
+        "sensor", "custom_dsmr", "http://192.168.1.121_voltage_l2"
+    )
+
+
+async def test_restore_state(hass):
+    """Test if the known sensors restore their state until the logger answers."""
+    entry_data = {
+        "host": "http://192.168.1.121",
+        "history_hour": True,
+        "history_day": False,
+        "history_month": False,
+    }
+    mock_entry = MockConfigEntry(domain="custom_dsmr", data=entry_data)
+    mock_entry.add_to_hass(hass)
+    registry = await hass.helpers.entity_registry.async_get_registry()
+    registry.async_get_or_create(
+        "sensor",
+        "custom_dsmr",
+        "http://192.168.1.121_voltage_l2",
+        suggested_object_id="voltage_l2",
+        config_entry=mock_entry,
+    )
+    registry.async_get_or_create(
+        "sensor",
+        "custom_dsmr",
+        "http://192.168.1.121_peak_demand",
+        suggested_object_id="peak_demand",
+        config_entry=mock_entry,
+    )
+    mock_restore_cache(
+        hass,
+        [
+            State("sensor.voltage_l2", "229.1"),
+            State("sensor.gas_hours_delivered_0", "0.32"),
+            State("sensor.peak_demand", "30.0"),
+        ],
+    )
+    with patch(
+        "homeassistant.components.custom_dsmr.coordinator.DSMRCoordinator._async_update_data",
+        return_value={},
+    ):
+        await hass.config_entries.async_setup(mock_entry.entry_id)
+        await hass.async_block_till_done()
+    assert hass.states.get("sensor.voltage_l2").state == "229.1"
+    assert hass.states.get("sensor.gas_hours_delivered_0").state == "0.32"
+    assert hass.states.get("sensor.power_delivered") is None
+    # The monthly peak continues from the restored state.
+    assert hass.states.get("sensor.peak_demand").state == "30.0"
+    coordinators = hass.data["custom_dsmr"][mock_entry.entry_id]
+    coordinator = coordinators["http://192.168.1.121"]
+    derived = coordinator.derived.update(
+        {"energy_delivered_tariff1": 1.0, "energy_delivered_tariff2": 1.0},
+        dt_util.utcnow(),
+    )
+    assert derived == {"energy_delivered_total": 2.0, "peak_demand": 30.0}
+
+
 async def test_actual_and_hour_setup(hass):
     """Test if the live and hourly sensors are initialized during setup."""
     entry_data = {
@@ -281,11 +442,15 @@ async def test_actual_and_hour_setup(hass):
     }
     mock_entry = MockConfigEntry(domain="custom_dsmr", data=entry_data)
     mock_entry.add_to_hass(hass)
-    await hass.config_entries.async_setup(mock_entry.entry_id)
-    await hass.async_block_till_done()
+    with patch(
+        "homeassistant.components.custom_dsmr.coordinator.DSMRCoordinator._async_update_data",
+        return_value=live_snapshot,
+    ):
+        await hass.config_entries.async_setup(mock_entry.entry_id)
+        await hass.async_block_till_done()
     await hass.helpers.entity_registry.async_get_registry()
     power_delivered = hass.states.get("sensor.power_delivered")
-    assert power_delivered.state == "unknown"
+    assert power_delivered.state == "3.264"
     gas_hours_delivered_0 = hass.states.get("sensor.gas_hours_delivered_0")
     assert gas_hours_delivered_0.state == "unknown"
 
@@ -300,11 +465,15 @@ async def test_actual_and_all_history_setup(hass):
     }
     mock_entry = MockConfigEntry(domain="custom_dsmr", data=entry_data)
     mock_entry.add_to_hass(hass)
-    await hass.config_entries.async_setup(mock_entry.entry_id)
-    await hass.async_block_till_done()
+    with patch(
+        "homeassistant.components.custom_dsmr.coordinator.DSMRCoordinator._async_update_data",
+        return_value=live_snapshot,
+    ):
+        await hass.config_entries.async_setup(mock_entry.entry_id)
+        await hass.async_block_till_done()
     await hass.helpers.entity_registry.async_get_registry()
     power_delivered = hass.states.get("sensor.power_delivered")
-    assert power_delivered.state == "unknown"
+    assert power_delivered.state == "3.264"
     gas_hours_delivered_0 = hass.states.get("sensor.gas_hours_delivered_0")
     assert gas_hours_delivered_0.state == "unknown"
     gas_days_delivered_0 = hass.states.get("sensor.gas_days_delivered_0")
@@ -313,17 +482,99 @@ async def test_actual_and_all_history_setup(hass):
     assert gas_months_delivered_0.state == "unknown"
 
 
+async def test_multiple_hosts_setup(hass):
+    """Test if every DSMR logger of an entry gets its own prefixed sensors."""
+    entry_data = {
+        "host": "http://192.168.1.121",
+        "hosts": ["http://192.168.1.121", "http://192.168.1.122"],
+        "history_hour": False,
+        "history_day": False,
+        "history_month": False,
+    }
+    mock_entry = MockConfigEntry(domain="custom_dsmr", data=entry_data)
+    mock_entry.add_to_hass(hass)
+    with patch(
+        "homeassistant.components.custom_dsmr.coordinator.DSMRCoordinator._async_update_data",
+        return_value=live_snapshot,
+    ):
+        await hass.config_entries.async_setup(mock_entry.entry_id)
+        await hass.async_block_till_done()
+    assert len(hass.data["custom_dsmr"][mock_entry.entry_id]) == 2
+    assert hass.states.get("sensor.192_168_1_121_power_delivered").state == "3.264"
+    assert hass.states.get("sensor.192_168_1_122_power_delivered").state == "3.264"
+    assert hass.states.get("sensor.power_delivered") is None
+
+
+async def test_unload_closes_sessions(hass):
+    """Test if the client sessions of the DSMR loggers are closed on unload."""
+    entry_data = {
+        "host": "http://192.168.1.121",
+        "hosts": ["http://192.168.1.121", "http://192.168.1.122"],
+        "history_hour": False,
+        "history_day": False,
+        "history_month": False,
+    }
+    mock_entry = MockConfigEntry(domain="custom_dsmr", data=entry_data)
+    mock_entry.add_to_hass(hass)
+    close_listeners = hass.bus.async_listeners().get(EVENT_HOMEASSISTANT_CLOSE, 0)
+    with patch(
+        "homeassistant.components.custom_dsmr.coordinator.DSMRCoordinator._async_update_data",
+        return_value={},
+    ):
+        await hass.config_entries.async_setup(mock_entry.entry_id)
+        await hass.async_block_till_done()
+    coordinators = hass.data["custom_dsmr"][mock_entry.entry_id]
+    sessions = [coordinator.session for coordinator in coordinators.values()]
+    assert sessions[0] is not sessions[1]
+    assert not any(session.closed for session in sessions)
+
+    assert await hass.config_entries.async_unload(mock_entry.entry_id)
+    assert all(session.closed for session in sessions)
+    # The sessions are no longer closed again when Home Assistant stops.
+    assert (
+        hass.bus.async_listeners().get(EVENT_HOMEASSISTANT_CLOSE, 0) == close_listeners
+    )
+    # The live sensor factories are no longer called.
+    assert not any(
+        coordinator._listeners  # pylint: disable=protected-access
+        for coordinator in coordinators.values()
+    )
+    assert mock_entry.entry_id not in hass.data["custom_dsmr"]
+
+
+async def test_stop_closes_sessions(hass):
+    """Test if the client sessions are closed when Home Assistant stops."""
+    mock_entry = MockConfigEntry(
+        domain="custom_dsmr", data={"host": "http://192.168.1.121"}
+    )
+    mock_entry.add_to_hass(hass)
+    with patch(
+        "homeassistant.components.custom_dsmr.coordinator.DSMRCoordinator._async_update_data",
+        return_value={},
+    ):
+        await hass.config_entries.async_setup(mock_entry.entry_id)
+        await hass.async_block_till_done()
+    coordinators = hass.data["custom_dsmr"][mock_entry.entry_id]
+    coordinator = coordinators["http://192.168.1.121"]
+
+    hass.bus.async_fire(EVENT_HOMEASSISTANT_CLOSE)
+    await hass.async_block_till_done()
+    assert coordinator.session.closed
+
+
 async def test_dsmr_live_sensor(hass):
-    """Test if the live sensor updates."""
+    """Test if the live sensor takes its state from the coordinator snapshot."""
     session = async_get_clientsession(hass)
-    data = DSMRLiveData(session, "1.2.3.4")
-    data.async_update = AsyncMock(return_value=dsmr_live_parsed)
-    entity = DSMRSensor("energy_delivered_tariff1", data)
+    coordinator = DSMRCoordinator(hass, session, {"host": "http://1.2.3.4"})
+    entity = DSMRSensor(coordinator, "energy_delivered_tariff1")
     assert entity.state is None
-    assert data.latest_data("energy_delivered_tariff1") is None
-    data._data = await data.async_update()  # pylint: disable=protected-access
-    assert data.data is dsmr_live_parsed
-    assert data.latest_data("energy_delivered_tariff1") == 10497.653
+    coordinator.live_data.async_update = AsyncMock(return_value=True)
+    coordinator.live_data._data = dsmr_live_parsed  # pylint: disable=protected-access
+    await coordinator.async_refresh()
+    assert coordinator.last_update_success
+    assert coordinator.data["energy_delivered_tariff1"] == 10497.653
+    entity = DSMRSensor(coordinator, "energy_delivered_tariff1")
+    assert entity.state == 10497.653
 
 
 async def test_dsmr_live_data(hass):
@@ -376,3 +627,57 @@ async def test_dsmr_hist_data_months(hass):
     data._data = await data.async_update()  # pylint: disable=protected-access
     assert data.data is not None
     assert data.data["gas_months_delivered_0"] == 30.72900000000027
+
+
+async def test_dsmr_sensor_deadband(hass):
+    """Test if changes within the deadband do not write a new state."""
+    session = async_get_clientsession(hass)
+    coordinator = DSMRCoordinator(hass, session, {"host": "http://1.2.3.4"})
+    entity = DSMRSensor(coordinator, "voltage_l1")
+    entity.hass = hass
+    entity.entity_id = "sensor.voltage_l1"
+
+    coordinator.data = {"voltage_l1": 227.3}
+    entity._handle_coordinator_update()  # pylint: disable=protected-access
+    assert hass.states.get("sensor.voltage_l1").state == "227.3"
+
+    coordinator.data = {"voltage_l1": 227.6}
+    entity._handle_coordinator_update()  # pylint: disable=protected-access
+    assert entity.state == 227.3
+    assert hass.states.get("sensor.voltage_l1").state == "227.3"
+
+    coordinator.data = {"voltage_l1": 228.1}
+    entity._handle_coordinator_update()  # pylint: disable=protected-access
+    assert entity.state == 228.1
+    assert hass.states.get("sensor.voltage_l1").state == "228.1"
+
+
+async def test_dsmr_hist_sensor_history_attribute(hass):
+    """Test if the *_1 history sensors expose the usage of the full ring buffer."""
+    session = async_get_clientsession(hass)
+    coordinator = DSMRCoordinator(
+        hass, session, {"host": "http://1.2.3.4", "history_hour": True}
+    )
+    coordinator.hist_data["hours"].parse_historical_data(dsmr_hist_hour_json)
+    entity = DSMRSensor(coordinator, "gas_hours_delivered_1")
+    entity.hass = hass
+    entity.entity_id = "sensor.gas_hours_delivered_1"
+    entity.async_write_ha_state()
+    assert hass.states.get("sensor.gas_hours_delivered_1").attributes["history"] == {
+        "20120711": dsmr_hist_hour_parsed["gas_hours_delivered_0"],
+        "20120710": dsmr_hist_hour_parsed["gas_hours_delivered_1"],
+    }
+    # The running hour follows the live readings, it has no history.
+    entity = DSMRSensor(coordinator, "gas_hours_delivered_0")
+    assert entity.device_state_attributes is None
+    assert DSMRSensor(coordinator, "power_delivered").device_state_attributes is None
+
+
+async def test_dsmr_sensor_last_fetched(hass):
+    """Test if the sensors tell when the data they show was received."""
+    session = async_get_clientsession(hass)
+    coordinator = DSMRCoordinator(hass, session, {"host": "http://1.2.3.4"})
+    fetched = dt_util.utcnow() - timedelta(seconds=90)
+    coordinator.live_data.fetched = fetched
+    entity = DSMRSensor(coordinator, "power_delivered")
+    assert entity.device_state_attributes == {"last_fetched": fetched.isoformat()}
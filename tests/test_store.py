@@ -0,0 +1,162 @@
+"""Tests for the local store of the DSMR logger history."""
+from array import array
+from datetime import datetime
+import os
+
+from homeassistant.components.custom_dsmr.history import (
+    HISTORY_FIELDS,
+    HistoryColumns,
+)
+from homeassistant.components.custom_dsmr.store import (
+    RECORD,
+    HistoryStore,
+    from_recid,
+    recid_range,
+    to_recid,
+)
+from tests.async_mock import patch
+from tests.common import MockConfigEntry, async_capture_events
+
+
+def history_columns(recids):
+    """Return columns with a running total of 1 per record, newest first."""
+    count = len(recids)
+    return HistoryColumns(
+        list(recids),
+        {
+            field: array("d", [float(count - index) for index in range(count)])
+            for field in HISTORY_FIELDS
+        },
+    )
+
+
+def test_to_recid():
+    """Test if a moment is converted to the recid of its record."""
+    assert to_recid(datetime(2020, 12, 7, 11, 30)) == 20120711
+
+
+def test_from_recid():
+    """Test if a recid is converted to the start of its hour."""
+    start = from_recid("20120711")
+    assert (start.year, start.month, start.day, start.hour) == (2020, 12, 7, 11)
+
+
+def test_recid_range():
+    """Test if the records of the first and last moment are included."""
+    start, end = datetime(2020, 12, 1, 12, 30), datetime(2020, 12, 31, 0, 0)
+    assert recid_range(start, end, "hours") == (20120112, 20123100)
+    assert recid_range(start, end, "days") == (20120100, 20123123)
+    assert recid_range(start, end, "months") == (20120000, 20123123)
+
+
+def test_store_append(tmp_path):
+    """Test if only the final records not stored yet are appended."""
+    path = tmp_path / "custom_dsmr" / "hours.bin"
+    store = HistoryStore(str(path))
+    assert store.last_recid is None
+
+    # The newest record is the running hour and is not stored.
+    assert store.append(history_columns(["20120711", "20120710", "20120709"])) == 2
+    assert store.last_recid == 20120710
+    assert store.append(history_columns(["20120711", "20120710", "20120709"])) == 0
+    assert store.append(history_columns(["20120712", "20120711", "20120710"])) == 1
+    assert path.stat().st_size == 3 * RECORD.size
+
+    # A reopened store continues after the last stored record, a record that
+    # was cut off is dropped.
+    with open(path, "ab") as store_file:
+        store_file.write(b"\0" * 5)
+    store = HistoryStore(str(path))
+    assert store.last_recid == 20120711
+    assert path.stat().st_size == 3 * RECORD.size
+
+
+def test_store_query(tmp_path):
+    """Test if records and usage are read for a range of recids."""
+    store = HistoryStore(str(tmp_path / "hours.bin"))
+    assert store.query(0, 99999999) == []
+    assert store.usage(0, 99999999) is None
+
+    recids = [f"201207{hour:02d}" for hour in range(23, -1, -1)]
+    store.append(history_columns(recids))
+
+    records = store.query(20120705, 20120707)
+    assert [recid for recid, _ in records] == [20120705, 20120706, 20120707]
+    assert records[0][1]["edt1"] == 6.0
+
+    # Three hours with a usage of 1 per field.
+    assert store.usage(20120705, 20120707) == {
+        "energy_delivered": 6.0,
+        "energy_returned": 6.0,
+        "gas_delivered": 3.0,
+    }
+    assert store.usage(20120800, 20120900) is None
+
+
+async def test_query_usage_service(hass):
+    """Test if the usage between two local moments is fired as an event."""
+    mock_entry = MockConfigEntry(
+        domain="custom_dsmr",
+        data={"host": "http://192.168.1.121", "history_hour": True},
+    )
+    mock_entry.add_to_hass(hass)
+    with patch(
+        "homeassistant.components.custom_dsmr.coordinator.DSMRCoordinator._async_update_data",
+        return_value={},
+    ):
+        await hass.config_entries.async_setup(mock_entry.entry_id)
+        await hass.async_block_till_done()
+    coordinator = hass.data["custom_dsmr"][mock_entry.entry_id]["http://192.168.1.121"]
+    recids = [f"201207{hour:02d}" for hour in range(23, -1, -1)]
+    await hass.async_add_executor_job(
+        coordinator.stores["hours"].append, history_columns(recids)
+    )
+
+    events = async_capture_events(hass, "custom_dsmr_usage")
+    await hass.services.async_call(
+        "custom_dsmr",
+        "query_usage",
+        {
+            "period": "hours",
+            "start": "2020-12-07 05:00:00",
+            "end": "2020-12-07 07:59:00",
+        },
+        blocking=True,
+    )
+    await hass.async_block_till_done()
+    assert events[0].data["usage"] == {
+        "http://192.168.1.121": {
+            "energy_delivered": 6.0,
+            "energy_returned": 6.0,
+            "gas_delivered": 3.0,
+        }
+    }
+
+
+async def test_remove_entry_removes_stores(hass, tmp_path):
+    """Test if the stores of the DSMR loggers are deleted with their entry."""
+    hass.config.config_dir = str(tmp_path)
+    mock_entry = MockConfigEntry(
+        domain="custom_dsmr",
+        data={"host": "http://192.168.1.121", "history_hour": True},
+    )
+    mock_entry.add_to_hass(hass)
+    with patch(
+        "homeassistant.components.custom_dsmr.coordinator.DSMRCoordinator._async_update_data",
+        return_value={},
+    ):
+        await hass.config_entries.async_setup(mock_entry.entry_id)
+        await hass.async_block_till_done()
+    coordinator = hass.data["custom_dsmr"][mock_entry.entry_id]["http://192.168.1.121"]
+    store = coordinator.stores["hours"]
+    assert store.path == str(
+        tmp_path / ".storage" / "custom_dsmr.http_192_168_1_121_hours.bin"
+    )
+    await hass.async_add_executor_job(
+        store.append, history_columns(["20120711", "20120710"])
+    )
+    assert os.path.exists(store.path)
+
+    await hass.config_entries.async_remove(mock_entry.entry_id)
+    await hass.async_block_till_done()
+    assert not os.path.exists(store.path)
@@ -0,0 +1,98 @@
+"""Tests for the incremental parsing of the DSMR logger responses."""
+import json
+
+import pytest
+
+from homeassistant.components.custom_dsmr.api import DSMRHistData, DSMRLiveData
+from homeassistant.components.custom_dsmr.stream import async_iter_json_array
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+
+from .test_sensor import dsmr_hist_hour_json, dsmr_hist_hour_parsed
+
+
+class MockContent:
+    """Response body that is handed out in chunks."""
+
+    def __init__(self, body):
+        """Initialize the body."""
+        self.body = body
+        self.chunks_read = 0
+
+    async def iter_chunked(self, size):
+        """Yield the body in chunks of the given size."""
+        for start in range(0, len(self.body), size):
+            self.chunks_read += 1
+            yield self.body[start : start + size]
+
+
+actual_body = json.dumps(
+    {
+        "actual": [
+            {"name": "timestamp", "value": "201207113025W"},
+            {"name": "power_delivered", "value": 3.264, "unit": "kW"},
+            {"name": "unknown_reading", "value": "€", "unit": ""},
+        ]
+    },
+    indent=2,
+    ensure_ascii=False,
+).encode()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 512])
+async def test_iter_json_array(chunk_size):
+    """Test if every object is yielded, whatever the chunk boundaries are."""
+    content = MockContent(actual_body)
+    received = [
+        item async for item in async_iter_json_array(content, "actual", chunk_size)
+    ]
+    assert received == json.loads(actual_body)["actual"]
+
+
+async def test_iter_json_array_stop_early():
+    """Test if the body is no longer read once the caller stops."""
+    content = MockContent(json.dumps(dsmr_hist_hour_json).encode())
+    async for item in async_iter_json_array(content, "hours", 16):
+        assert item["recnr"] == 0
+        break
+    assert content.chunks_read < len(content.body) / 16
+
+
+async def test_iter_json_array_invalid():
+    """Test if a response without the array or a truncated one is rejected."""
+    with pytest.raises(ValueError):
+        async for _ in async_iter_json_array(MockContent(b"{}"), "actual"):
+            pass
+    with pytest.raises(ValueError):
+        async for _ in async_iter_json_array(MockContent(actual_body[:60]), "actual"):
+            pass
+
+
+async def test_live_data_streaming(hass, aioclient_mock):
+    """Test if only the readings with a sensor are kept from the response."""
+    api = "http://1.2.3.4/api/v1/sm/actual"
+    aioclient_mock.get(api, text=actual_body.decode())
+    live_data = DSMRLiveData(async_get_clientsession(hass), api)
+    await live_data.async_update()
+    assert "unknown_reading" not in live_data.data
+    assert live_data.latest_data("power_delivered") == 3.264
+    assert live_data.stats.requests == 1
+    assert live_data.stats.payload_size == len(actual_body)
+
+
+async def test_live_data_server_error(hass, aioclient_mock):
+    """Test if an error response counts as a client error, not a parse error."""
+    api = "http://1.2.3.4/api/v1/sm/actual"
+    aioclient_mock.get(api, status=500, text="Internal Server Error")
+    live_data = DSMRLiveData(async_get_clientsession(hass), api)
+    assert not await live_data.async_update()
+    assert live_data.stats.client_errors == 1
+    assert live_data.stats.parse_errors == 0
+
+
+async def test_hist_data_streaming(hass, aioclient_mock):
+    """Test if the history records are parsed while they are read."""
+    api = "http://1.2.3.4/api/v1/hist/hours"
+    aioclient_mock.get(api, text=json.dumps(dsmr_hist_hour_json))
+    hist_data = DSMRHistData(async_get_clientsession(hass), api, "hours")
+    await hist_data.async_update()
+    assert hist_data.data == dsmr_hist_hour_parsed